@@ -1,71 +1,4 @@
 const { parse } = require("csv-parse/sync");
-const DiffMatchPatch = require('diff-match-patch');
-
-function regexIndexOf(string, regex, startpos) {
-    var indexOf = string.substring(startpos || 0).normalize('NFD').replace(/[\u0300-\u036f]/g, '').search(regex);
-    return (indexOf >= 0) ? (indexOf + (startpos || 0)) : indexOf;
-}
-
-DiffMatchPatch.prototype.diff_linesToWords_ = function(text1, text2) {
-    var lineArray = [];  // e.g. lineArray[4] == 'Hello\n'
-    var lineHash = {};   // e.g. lineHash['Hello\n'] == 4
-  
-    // '\x00' is a valid character, but various debuggers don't like it.
-    // So we'll insert a junk entry to avoid generating a null character.
-    lineArray[0] = '';
-  
-    /**
-     * Split a text into an array of strings.  Reduce the texts to a string of
-     * hashes where each Unicode character represents one line.
-     * Modifies linearray and linehash through being a closure.
-     * @param {string} text String to encode.
-     * @return {string} Encoded string.
-     * @private
-     */
-    function diff_linesToCharsMunge_(text) {
-      var chars = '';
-      // Walk the text, pulling out a substring for each line.
-      // text.split('\n') would would temporarily double our memory footprint.
-      // Modifying text would create many large strings to garbage collect.
-      var lineStart = 0;
-      var lineEnd = -1;
-      // Keeping our own length variable is faster than looking it up.
-      var lineArrayLength = lineArray.length;
-      while (lineEnd < text.length - 1) {
-        lineEnd = regexIndexOf(text, /.\b/, lineStart);
-        if (lineEnd == -1) {
-          lineEnd = text.length - 1;
-        }
-        var line = text.substring(lineStart, lineEnd + 1);
-  
-        if (lineHash.hasOwnProperty ? lineHash.hasOwnProperty(line) :
-            (lineHash[line] !== undefined)) {
-          chars += String.fromCharCode(lineHash[line]);
-        } else {
-          if (lineArrayLength == maxLines) {
-            // Bail out at 65535 because
-            // String.fromCharCode(65536) == String.fromCharCode(0)
-            line = text.substring(lineStart);
-            lineEnd = text.length;
-          }
-          chars += String.fromCharCode(lineArrayLength);
-          lineHash[line] = lineArrayLength;
-          lineArray[lineArrayLength++] = line;
-        }
-        lineStart = lineEnd + 1;
-      }
-      return chars;
-    }
-    // Allocate 2/3rds of the space for text1, the rest for text2.
-    var maxLines = 40000;
-    var chars1 = diff_linesToCharsMunge_(text1);
-    maxLines = 65535;
-    var chars2 = diff_linesToCharsMunge_(text2);
-    return {chars1: chars1, chars2: chars2, lineArray: lineArray};
-};
-
-const dmp = new DiffMatchPatch();
-
 function getCurrent(arr, date) {
     return arr.find((c) => c.start < date && date < c.end)
 }
@@ -79,16 +12,16 @@ module.exports = function(eleventyConfig) {
         return arr.filter((el) => eval(`const { ${key} } = el; ${cond}`))
     });
     eleventyConfig.addFilter("date", (dateString) => new Date(dateString).toLocaleDateString('fr-FR', { year: 'numeric', month: 'long', day: 'numeric' }));
-    eleventyConfig.addFilter("diff", function(text1, text2) {
-        var a = dmp.diff_linesToWords_(text1 || '', text2 || '');
-        var lineText1 = a.chars1;
-        var lineText2 = a.chars2;
-        var lineArray = a.lineArray;
-        let diffs = dmp.diff_main(lineText1, lineText2, false);
-        dmp.diff_cleanupSemantic(diffs);
-        dmp.diff_charsToLines_(diffs, lineArray);
-        dmp.diff_cleanupSemanticLossless(diffs);
-        return diffs;
+    eleventyConfig.addFilter("diff_spans", function(diff, text1, text2) {
+        // [op, length] runs of the diff from text1 to text2, as [op, text]
+        text1 = String(text1 ?? ''), text2 = String(text2 ?? '');
+        let i = 0, j = 0;
+        return (diff || []).map(([op, length]) => {
+            const text = op > 0 ? text2.slice(j, j + length) : text1.slice(i, i + length);
+            if (op <= 0) i += length;
+            if (op >= 0) j += length;
+            return [op, text];
+        });
     });
     eleventyConfig.addFilter("intsort", (arr, key) => arr.sort((a, b) => isNaN(a[key]) ? 1 : (isNaN(b[key]) ? -1 : a[key] - b[key])));
     eleventyConfig.addFilter("find", function(arr, key, value) { return arr.find((obj) => value === undefined ? obj[key] : obj[key] == value) });
@@ -97,9 +30,18 @@ module.exports = function(eleventyConfig) {
     eleventyConfig.addFilter("int", function(arr) { return Array.isArray(arr) ? arr.map(i => parseInt(i)) : parseInt(arr) });
     eleventyConfig.addFilter("where_in", (arr1, key, arr2) => arr1.filter((e) => arr2.includes(e[key])));
     eleventyConfig.addFilter("where_includes", (arr1, key, value) => arr1.filter((e) => e[key].includes(value)));
+    eleventyConfig.addFilter("at", (indices, arr) => (indices || []).map((i) => arr[i]));
     eleventyConfig.addFilter("map_entries", (obj, key, value) => Object.entries(obj).map(([k, v]) => ({[key]: Number(k), [value]: v})));
 
     // Data specific filters
+    eleventyConfig.addFilter("positions", function(positions, members) {
+        // JSON object of member ids, or one character per member of position_members.json
+        if (typeof positions !== "string") {
+            return Object.entries(positions || {}).map(([k, v]) => ({ member_id: Number(k), position: v }))
+        }
+        const names = { P: 'FOR', C: 'AGAINST', A: 'ABSTENTION' }
+        return [...positions].flatMap((c, i) => names[c] ? [{ member_id: members[i], position: names[c] }] : [])
+    });
     eleventyConfig.addFilter("current", function(arr, date = new Date().toISOString()) {
         func = (member) => {
             const { party, partyid } = getCurrent(member.constituencies, date) || {}
@@ -139,6 +81,7 @@ module.exports = function(eleventyConfig) {
     eleventyConfig.addPassthroughCopy("favicon.ico");
     eleventyConfig.addPassthroughCopy("robots.txt");
     eleventyConfig.addPassthroughCopy("*.js");
+    eleventyConfig.addPassthroughCopy("search_index");
 
     eleventyConfig.addDataExtension("csv", (contents, filePath) => {
         const records = parse(contents, {
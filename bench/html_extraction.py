@@ -0,0 +1,200 @@
+"""Compare the lxml extraction of EP and OEIL pages with the former bs4 one.
+
+Pages come from the inputs recorded by `suite.py record`. The fields of
+OEIL procedure pages, document pages, attendance registers and PV pages are
+extracted by both implementations, which must agree, then timed.
+
+    python bench/html_extraction.py
+"""
+
+import json
+import os
+import timeit
+
+import bs4
+import country_converter as coco
+import typer
+from dateutil.parser import parse as parsedate
+
+import suite
+from imports import (
+    EP_URL,
+    PROC_RE,
+    REPLAY_ENV,
+    attendees,
+    cached_session,
+    extract_ref,
+    normalize,
+    parse_doc,
+    parse_html,
+    parse_proc,
+    pv_returns,
+)
+
+
+def proc_reference(content, url):
+    html = bs4.BeautifulSoup(content, features="lxml")
+    tag = html.find(string="Subject")
+    subjects = set()
+    if tag:
+        for elem in tag.parent.next_siblings:
+            match elem.name:
+                case None:
+                    subject = elem.text.strip().split(" ")[0]
+                    if subject:
+                        subjects.add(subject)
+                case "strong":
+                    break
+    tag = html.find(string="Geographical area")
+    countries = set()
+    if tag:
+        for elem in tag.parent.next_siblings:
+            match elem.name:
+                case None:
+                    country = elem.text.strip().split(",")[0]
+                    if country:
+                        countries.add(coco.convert(country, to="ISO2", not_found=None))
+                case "strong":
+                    break
+    for subject in list(subjects):
+        parts = subject.split(".")
+        for i in range(len(parts)):
+            subjects.add(".".join(parts[: i + 1]))
+    committees = None
+    try:
+        committees = [
+            span.text
+            for span in html.find(string="Acteurs principaux")
+            .find_next("table")
+            .find_all(class_="erpl_badge-committee")
+        ]
+    except:
+        pass
+    return dict(
+        reference=html.find(class_="erpl_title-h1").text.replace("&nbsp;", " "),
+        date=parsedate(
+            html.find(string="Evénements clés")
+            .find_next("table")
+            .select_one("tr:last-child td")
+            .text
+        ),
+        title=html.find(class_="erpl_title-h2").text.replace("&nbsp;", " "),
+        type=html.find(string="Type de procédure").find_next("td").text.split(" - ")[0],
+        subjects=json.dumps(list(subjects)),
+        countries=json.dumps(list(countries)),
+        committees=json.dumps(committees),
+        docs=json.dumps(
+            [
+                td.text
+                for td in html.find(string="Portail de documentation")
+                .find_next("table")
+                .select("td:nth-child(2)")
+            ]
+        ),
+        status=html.find(string="Statut").find_next("p").text,
+        url=url,
+    )
+
+
+def doc_reference(content):
+    html = bs4.BeautifulSoup(content, features="lxml")
+    try:
+        procedure = extract_ref(html.find(string=PROC_RE).text)
+    except:
+        procedure = None
+    pdf_urls = []
+    if amd_data := html.find(id="amdData"):
+        for a in amd_data.find_all("a", attrs={"aria-label": "pdf"}):
+            pdf_urls.append(EP_URL + a.attrs["href"])
+    return procedure, pdf_urls
+
+
+def attendees_reference(content):
+    html = bs4.BeautifulSoup(content, features="lxml")
+    names = set()
+    for content in html.select("p.contents"):
+        if ":" not in content.text:
+            names.update(normalize(name.strip()) for name in content.text.split(", "))
+    return names
+
+
+def pv_returns_reference(content, docs):
+    pv = bs4.BeautifulSoup(content, features="lxml")
+    returns = {}
+    for doc in docs:
+        for match in pv.findAll(string=doc):
+            try:
+                lines = [
+                    p.text.lower()
+                    for p in match.find_parent("p").find_next_siblings("p")
+                ]
+            except:
+                continue
+            for i, line in enumerate(lines):
+                if "renvoi en commission" in line:
+                    returns.setdefault(
+                        doc,
+                        (
+                            "ADOPTED"
+                            if "approuvé" in "".join(lines[i + 1 : i + 2])
+                            else "REJECTED"
+                        ),
+                    )
+    return returns
+
+
+def proc_pages():
+    for ref in suite.PROCEDURES:
+        url = f"https://oeil.secure.europarl.europa.eu/oeil/popups/ficheprocedure.do?reference={ref}&l=fr"
+        content = cached_session().get(url, cookies={"oeilLanguage": "fr"}).content
+        yield content, url
+
+
+# Page type: inputs, former extraction, lxml extraction
+EXTRACTIONS = {
+    "oeil": (
+        proc_pages,
+        proc_reference,
+        lambda content, url: parse_proc(parse_html(content), url),
+    ),
+    "doc": (
+        lambda: ((cached_session().get(url).content,) for url in suite.DOCS),
+        doc_reference,
+        lambda content: parse_doc(parse_html(content)),
+    ),
+    "attendance": (
+        lambda: ((content,) for content in suite.attendance_pages()),
+        attendees_reference,
+        attendees,
+    ),
+    "pv": (
+        suite.pv_pages,
+        pv_returns_reference,
+        lambda content, docs: pv_returns(parse_html(content), docs),
+    ),
+}
+
+
+def main(number: int = 5):
+    os.environ[REPLAY_ENV] = str(suite.ARCHIVE)
+    os.chdir(suite.ROOT)
+    for name, (pages, reference, extract) in EXTRACTIONS.items():
+        with suite.quiet():
+            pages = list(pages())
+        for page in pages:
+            assert extract(*page) == reference(*page), f"{name}: {page[1:]}"
+        print(f"{name}: {len(pages)} pages")
+        times = []
+        for label, fn in (("bs4", reference), ("lxml", extract)):
+            seconds = min(
+                timeit.repeat(
+                    lambda: [fn(*page) for page in pages], number=number, repeat=3
+                )
+            )
+            times.append(seconds / number / len(pages))
+            print(f"  {label}: {times[-1] * 1000:.2f} ms per page")
+        print(f"  {times[0] / times[1]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    typer.run(main)
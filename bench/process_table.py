@@ -0,0 +1,109 @@
+"""Compare `process_table` with its former implementation on VOT files.
+
+The tables of the old XML format (before 2024-01-16) are parsed by both
+implementations, which must agree, then timed.
+
+    python bench/process_table.py 2023-12-13 2023-11-22
+"""
+
+import sys
+import timeit
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import List
+
+import typer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from imports import EP_BASE_URL, cached_session, process_table
+
+DATES = [
+    "2023-12-13",
+    "2023-11-22",
+    "2023-10-04",
+    "2023-09-13",
+    "2023-07-12",
+    "2023-06-14",
+    "2023-05-10",
+    "2023-04-19",
+]
+
+
+def process_table_reference(table, header=True):
+    rows = []
+    rowspans = {}
+    col_nb = int(table.find("COLGROUP").get("COLNB"))
+    for tr in table.findall("TBODY/TR"):
+        row = []
+        i = 0
+        while i < col_nb:
+            td = tr.find(f"TD[@COLNAME='C{i+1}']")
+            if td is not None:
+                row.append(" ".join(td.itertext()).replace("\xa0", " "))
+                if "COLSPAN" in td.keys() and len(rows) > 0:  # skip colspan in header
+                    cols_to_add = int(td.get("COLSPAN")) - 1
+                    row.extend(cols_to_add * [None])
+                if "ROWSPAN" in td.keys():
+                    rowspans[i] = int(td.get("ROWSPAN")) - 1
+            elif i in rowspans:
+                rowspan = rowspans[i]
+                row.append(rows[-1][i])
+                if rowspan == 1:
+                    del rowspans[i]
+                else:
+                    rowspans[i] = rowspan - 1
+            else:
+                row.append(None)
+            i += 1
+        rows.append(row)
+    if len(rows) == 0:
+        return []
+    if header:
+        header = rows[0]
+        return [
+            {
+                col_name.replace("\t", ""): row[i]
+                for i, col_name in enumerate(header)
+                if col_name
+            }
+            for row in rows[1:]
+        ]
+    return rows
+
+
+def vot_tables(vote_date):
+    url = f"{EP_BASE_URL}PV-9-{vote_date}-VOT_FR.xml"
+    response = cached_session().get(url)
+    response.raise_for_status()
+    xml = ET.fromstring(response.content)
+    for vote in xml[0].find("Vote.Results"):
+        table = vote.find("Vote.Result.Table.Results/TABLE")
+        if table is not None:
+            yield table, True
+        table = vote.find("Vote.Result.Table.Requests/TABLE")
+        if table is not None:
+            yield table, False
+
+
+def main(dates: List[str] = typer.Argument(None), number: int = 20):
+    tables = [table for vote_date in dates or DATES for table in vot_tables(vote_date)]
+    cells = sum(len(table.findall("TBODY/TR/TD")) for table, _ in tables)
+    print(f"{len(tables)} tables, {cells} cells")
+
+    for table, header in tables:
+        assert process_table(table, header) == process_table_reference(table, header)
+
+    for fn in (process_table_reference, process_table):
+        seconds = min(
+            timeit.repeat(
+                lambda: [fn(table, header) for table, header in tables],
+                number=number,
+                repeat=5,
+            )
+        )
+        print(f"{fn.__name__}: {seconds / number * 1000:.2f} ms per pass")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,355 @@
+"""Offline benchmarks of the parsing hot paths of `imports.py`.
+
+The inputs are recorded once in an HTTP replay archive, along with samples
+of the Parltrack dumps. This needs the network and the full dumps in the
+repository root (`python imports.py members` downloads them), and neither the
+archive nor the samples are committed:
+
+    python bench/suite.py record
+
+Benchmarks then run from them without any network access and report their
+operations per second and peak memory (traced Python allocations), compared
+with the baseline when there is one:
+
+    python bench/suite.py run
+    python bench/suite.py run process_table votes
+    python bench/suite.py run --save  # the results become the baseline
+
+The baseline depends on the machine, so it is not committed either: save one
+before a change and compare with it after.
+"""
+
+import contextlib
+import json
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import date, timedelta
+from pathlib import Path
+from typing import List
+
+import lzip
+import typer
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import imports
+from imports import (
+    DOC_RE,
+    EP_BASE_URL,
+    RECORD_ENV,
+    REPLAY_ENV,
+    attendees,
+    cached_session,
+    collect_session,
+    extract_amendments,
+    extract_pages,
+    fetch_attendance,
+    merge_votes,
+    parse_author,
+    parse_doc,
+    parse_html,
+    parse_proc,
+    parse_session,
+    parse_subject,
+    parse_title,
+    process_table,
+    pv_returns,
+    read_json,
+    read_rows,
+)
+
+BENCH_DIR = Path(__file__).resolve().parent
+ARCHIVE = BENCH_DIR / "inputs.warc"
+DUMPS_DIR = BENCH_DIR / "dumps"
+BASELINE = BENCH_DIR / "baseline.json"
+
+# Plenary sessions as (term, first day, number of days), the VOT files before
+# 2024-01-16 are in the former XML format
+SESSIONS = [
+    (9, date(2023, 12, 11), 4),
+    (9, date(2023, 11, 20), 4),
+    (10, date(2024, 10, 21), 4),
+    (10, date(2024, 11, 25), 4),
+]
+PROCEDURES = ["2021/0106(COD)", "2022/0195(COD)", "2020/0279(COD)", "2023/0079(COD)"]
+# Document pages listing amendment PDFs
+DOCS = [
+    f"{EP_BASE_URL}A-9-2023-0188_FR.html",
+    f"{EP_BASE_URL}A-9-2023-0220_FR.html",
+]
+# Records kept from each dump
+DUMPS = {"ep_meps.json": 2000, "ep_mep_activities.json": 200}
+
+BENCHMARKS = {}
+
+
+def benchmark(unit):
+    """Register a benchmark.
+
+    It loads its inputs and returns the number of `unit` processed by the
+    function it returns, which is the one timed.
+    """
+
+    def register(setup):
+        BENCHMARKS[setup.__name__.removeprefix("bench_")] = (unit, setup)
+        return setup
+
+    return register
+
+
+def sessions():
+    for term, start, days in SESSIONS:
+        yield term, (start, [start + timedelta(days=i) for i in range(days)])
+
+
+def vot_files(new_format=False):
+    for term, (_, vote_dates) in sessions():
+        for vote_date in vote_dates:
+            if (vote_date >= date(2024, 1, 16)) is new_format:
+                url = f"{EP_BASE_URL}PV-{term}-{vote_date}-VOT_FR.xml"
+                response = cached_session().get(url)
+                if response.ok:
+                    yield ET.fromstring(response.content)
+
+
+def vot_tables():
+    for xml in vot_files():
+        for vote in xml[0].find("Vote.Results"):
+            table = vote.find("Vote.Result.Table.Results/TABLE")
+            if table is not None:
+                yield table, True
+            table = vote.find("Vote.Result.Table.Requests/TABLE")
+            if table is not None:
+                yield table, False
+
+
+def vote_subjects():
+    """(subject, amendment, author) of the votes of the VOT files."""
+    for table, header in vot_tables():
+        if header:
+            for row in process_table(table):
+                yield row["Objet"] or "", row.get("Am n°"), row.get("Auteur") or ""
+    for xml in vot_files(new_format=True):
+        for voting in xml.iterfind(".//voting"):
+            subject = "".join(
+                voting.find(tag).text or ""
+                for tag in ("title", "label", "amendmentSubject")
+            )
+            yield (
+                subject,
+                voting.find("amendmentNumber").text,
+                voting.find("amendmentAuthor").text or "",
+            )
+
+
+def attendance_pages():
+    for term, (_, vote_dates) in sessions():
+        imports.TERM = term
+        for vote_date in vote_dates:
+            if content := fetch_attendance(cached_session(), vote_date):
+                yield content
+
+
+def pv_pages():
+    """(content, documents mentioned) of the PV pages."""
+    for term, (_, vote_dates) in sessions():
+        for vote_date in vote_dates:
+            url = f"{EP_BASE_URL}PV-{term}-{vote_date}_FR.html"
+            response = cached_session().get(url)
+            if response.ok:
+                docs = dict.fromkeys(m[0] for m in re.finditer(DOC_RE, response.text))
+                yield response.content, docs
+
+
+def procedure_pages():
+    """(content, url) of the OEIL pages of the procedures."""
+    for ref in PROCEDURES:
+        url = f"https://oeil.secure.europarl.europa.eu/oeil/popups/ficheprocedure.do?reference={ref}&l=fr"
+        response = cached_session().get(url, cookies={"oeilLanguage": "fr"})
+        response.raise_for_status()
+        yield response.content, url
+
+
+def amendment_pdfs():
+    for url in DOCS:
+        _, pdf_urls = parse_doc(parse_html(cached_session().get(url).content))
+        for pdf_url in pdf_urls:
+            yield cached_session().get(pdf_url).content
+
+
+@benchmark("tables")
+def bench_process_table():
+    tables = list(vot_tables())
+    return len(tables), lambda: [process_table(*table) for table in tables]
+
+
+@benchmark("titles")
+def bench_parse_title():
+    titles = [subject for subject, _, _ in vote_subjects()]
+    return len(titles), lambda: [parse_title(title) for title in titles]
+
+
+@benchmark("subjects")
+def bench_parse_subject():
+    subjects = [(subject, amd) for subject, amd, _ in vote_subjects()]
+    return len(subjects), lambda: [parse_subject(*subject) for subject in subjects]
+
+
+@benchmark("authors")
+def bench_parse_author():
+    authors = [author for _, _, author in vote_subjects() if author]
+    return len(authors), lambda: [parse_author(author) for author in authors]
+
+
+@benchmark("pdfs")
+def bench_extract_table():
+    pdfs = list(amendment_pdfs())
+    return len(pdfs), lambda: [extract_pages(pdf, 0, None) for pdf in pdfs]
+
+
+@benchmark("amendments")
+def bench_extract_amendments():
+    tables = [extract_pages(pdf, 0, None) for pdf in amendment_pdfs()]
+    amendments = sum(len(list(extract_amendments(rows))) for rows in tables)
+    return amendments, lambda: [list(extract_amendments(rows)) for rows in tables]
+
+
+@benchmark("procedures")
+def bench_parse_proc():
+    pages = list(procedure_pages())
+    return len(pages), lambda: [
+        parse_proc(parse_html(content), url) for content, url in pages
+    ]
+
+
+@benchmark("pages")
+def bench_attendees():
+    pages = list(attendance_pages())
+    return len(pages), lambda: [attendees(page) for page in pages]
+
+
+@benchmark("pages")
+def bench_pv_returns():
+    pages = list(pv_pages())
+    return len(pages), lambda: [
+        pv_returns(parse_html(content), docs) for content, docs in pages
+    ]
+
+
+@benchmark("records")
+def bench_read_json():
+    paths = [str(DUMPS_DIR / filename) for filename in DUMPS]
+    records = sum(DUMPS.values())
+    return records, lambda: [sum(1 for _ in read_json(path)) for path in paths]
+
+
+@benchmark("sessions")
+def bench_votes():
+    mepmap = {
+        mep["last_name"].capitalize(): int(mep["id"])
+        for mep in read_rows("members", "id", "last_name")
+    }
+    mep_ids = frozenset(mepmap.values())
+    terms = list(sessions())
+
+    def run():
+        processed = set()
+        for term, sess in terms:
+            imports.TERM = term
+            days = parse_session(sess, mepmap, mep_ids)
+            merge_votes(*collect_session(sess[0], days, processed))
+
+    return len(terms), run
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress prints and bars of the imports."""
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            yield
+
+
+def measure(fn, repeat):
+    """Best time of `fn` in seconds, and the peak of its traced allocations."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    seconds = min(timer.repeat(repeat, number)) / number
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def change(value, previous):
+    return f"{(value / previous - 1) * 100:+.1f}%" if previous else ""
+
+
+app = typer.Typer()
+
+
+@app.command()
+def record():
+    """Record the inputs of the benchmarks from the network."""
+    ARCHIVE.unlink(missing_ok=True)
+    os.environ[RECORD_ENV] = str(ARCHIVE)
+    os.chdir(ROOT)
+    DUMPS_DIR.mkdir(exist_ok=True)
+    for filename, records in DUMPS.items():
+        lines = []
+        for item in read_json(filename):
+            lines.append(b"," + json.dumps(item).encode())
+            if len(lines) == records:
+                break
+        lines[0] = b"[" + lines[0][1:]
+        lines.append(b"]")
+        lzip.compress_to_file(DUMPS_DIR / f"{filename}.lz", b"\n".join(lines) + b"\n")
+    for name, (_, setup) in BENCHMARKS.items():
+        print(f"Recording {name}")
+        with quiet():
+            _, fn = setup()
+            fn()
+
+
+@app.command()
+def run(
+    names: List[str] = typer.Argument(None),
+    repeat: int = 5,
+    save: bool = False,
+    baseline: Path = BASELINE,
+):
+    """Run the benchmarks, all of them unless `names` are given."""
+    if not ARCHIVE.exists():
+        sys.exit(f"{ARCHIVE} is missing, run `python bench/suite.py record` first")
+    os.environ[REPLAY_ENV] = str(ARCHIVE)
+    os.chdir(ROOT)
+    previous = json.loads(baseline.read_text()) if baseline.exists() else {}
+    results = {}
+    for name in names or BENCHMARKS:
+        unit, setup = BENCHMARKS[name]
+        with quiet():
+            ops, fn = setup()
+            seconds, peak = measure(fn, repeat)
+        results[name] = dict(ops_per_sec=ops / seconds, peak_memory=peak)
+        before = previous.get(name, {})
+        print(
+            f"{name:<18} {ops / seconds:>12.1f} {unit + '/s':<13}"
+            f" {change(ops / seconds, before.get('ops_per_sec')):>8}"
+            f" {peak / 1e6:>9.2f} MB peak"
+            f" {change(peak, before.get('peak_memory')):>8}"
+        )
+    if save:
+        baseline.write_text(json.dumps({**previous, **results}, indent=2) + "\n")
+        print(f"Saved to {baseline}")
+    elif not previous:
+        print(f"No baseline in {baseline}, save one with --save")
+
+
+if __name__ == "__main__":
+    app()
@@ -2,23 +2,75 @@ input = document.getElementById('search')
 theme = document.getElementById('theme');
 area = document.getElementById('area');
 lis = document.getElementById("list").getElementsByTagName('article');
+results = document.getElementById('results');
 
-getSelectedValue = (select) => select.selectedIndex > 0 ? select.options[select.selectedIndex].text : '' 
+// Shards of the index built by `python imports.py search`, fetched on demand
+shards = {}
+documents = null
+searches = 0
+const PREFIX = 2
+const ICONS = { speech: '💬', amendment: '📝' }
 
-function filter() {
-  query = input.value.toLowerCase();
-  tokens = query.split(/\s+/).map((token) => token).filter(Boolean)
+getSelectedValue = (select) => select.selectedIndex > 0 ? select.options[select.selectedIndex].text : ''
+
+// Accent-folded words, like imports.tokenize
+tokenize = (text) => text.normalize('NFD').replace(/[^\x00-\x7f]/g, '').toLowerCase().match(/[a-z0-9]+/g) || []
+
+function shard(prefix) {
+  if (!(prefix in shards)) {
+    shards[prefix] = fetch(`/search_index/${prefix}.json`).then((res) => res.ok ? res.json() : {})
+  }
+  return shards[prefix]
+}
+
+// Ids of the documents holding all tokens, the last one being a prefix of a word
+async function search(tokens) {
+  let ids = null
+  for (const [i, token] of tokens.entries()) {
+    const postings = await shard(token.slice(0, PREFIX))
+    const words = i == tokens.length - 1 ? Object.keys(postings).filter((word) => word.startsWith(token)) : [token]
+    const found = new Set()
+    for (const word of words) {
+      let id = 0
+      for (const delta of postings[word] || []) found.add(id += delta)
+    }
+    ids = ids ? new Set([...ids].filter((id) => found.has(id))) : found
+  }
+  return ids
+}
+
+async function filter() {
+  const current = ++searches
+  const tokens = tokenize(input.value).filter((token) => token.length >= PREFIX)
+  let urls = null
+  let hits = []
+  if (tokens.length) {
+    documents = documents || fetch('/search_index/documents.json').then((res) => res.json())
+    const [ids, entries] = await Promise.all([search(tokens), documents])
+    if (current != searches) return
+    hits = [...ids].map((id) => entries[id])
+    urls = new Set(hits.map(([kind, title, url]) => url))
+  }
 
   for (const li of lis) {
-    string = li.getElementsByTagName("a")[0].textContent.toLowerCase();
+    href = li.getElementsByTagName("a")[0].getAttribute('href');
     header = li.getElementsByTagName("header")[0].textContent;
     if (header.includes(getSelectedValue(theme))
       && header.includes(getSelectedValue(area))
-      && (tokens.length == 0 || tokens.every((token) => string.includes(token)))
+      && (urls == null || urls.has(href))
     ) {
       li.style.display = "";
     } else {
       li.style.display = "none";
     }
   }
-}
\ No newline at end of file
+
+  results.replaceChildren(...hits.filter(([kind]) => kind in ICONS).slice(0, 50).map(([kind, title, url]) => {
+    const item = document.createElement('li')
+    const link = document.createElement(url ? 'a' : 'span')
+    if (url) link.href = url
+    link.textContent = `${ICONS[kind]} ${title}`
+    item.append(link)
+    return item
+  }))
+}
@@ -1,31 +1,128 @@
+import atexit
+import fcntl
 import json
 import csv
+import difflib
+import hashlib
 import io
+import operator
+import os
 import sys
 import re
+import resource
+import threading
+import time
 import unicodedata
+import uuid
+import zlib
 import xml.etree.ElementTree as ET
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
 from datetime import datetime as dt, date, timezone, timedelta
 from dateutil.parser import parse as parsedate
+from email.utils import format_datetime
 from pathlib import Path
 from enum import StrEnum, auto
+from typing import List, Optional
 from urllib import parse
 
 import typer
 import lzip
 import bs4
+import lxml.html
 import requests
-from requests_cache import CachedSession
+from lxml import etree
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util import Retry
+from requests_cache import (
+    NEVER_EXPIRE,
+    CacheMixin,
+    SerializerPipeline,
+    Stage,
+    pickle_serializer,
+)
 import pdfplumber as pp
 from tqdm import tqdm
 import country_converter as coco
+from sqlalchemy import create_engine, delete, event, func, select
+from sqlalchemy.dialects.sqlite import insert
+
+import models
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
 
 csv.field_size_limit(sys.maxsize)
 
 
 PARLTRACK_DUMPS_URL = "https://parltrack.org/dumps/"
 EP_BASE_URL = "https://www.europarl.europa.eu/doceo/document/"
-TERM = 10
+CURRENT_TERM = 10
+# Term being imported and where its outputs go, see `use_term`
+TERM = CURRENT_TERM
+DATA_DIR = Path("_data")
+# Outputs of past terms, kept out of `_data` which only the current term uses
+TERMS_DIR = Path("terms")
+# Static files of the search index, served along with the site
+SEARCH_DIR = Path("search_index")
+# Tokens are sharded by their first characters, shorter tokens are not indexed
+SEARCH_PREFIX = 2
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+CACHE_DIR = Path("cache")
+DIFF_CACHE_FILE = CACHE_DIR / "amendment_diff_runs.json"
+PDF_PAGES_PER_TASK = 4
+DB_BATCH_SIZE = 500
+DB = None
+POSITION_CODES = {"FOR": 1, "AGAINST": 2, "ABSTENTION": 3}  # 0 is no vote
+# Compact positions have one of these per member of POSITION_MEMBERS_FILE, "."
+# when the member did not vote
+POSITION_CHARS = {"FOR": "P", "AGAINST": "C", "ABSTENTION": "A"}
+POSITION_MEMBERS_FILE = "position_members.json"
+CACHE_MAX_SIZE = 2 << 30
+# First matching pattern wins, anything else is kept until evicted. Only the
+# amendment PDFs never change once published.
+CACHE_EXPIRY = {
+    "www.europarl.europa.eu/doceo/document/*.pdf": NEVER_EXPIRE,
+    "www.europarl.europa.eu/doceo/document/PV-*": timedelta(days=30),
+    "www.europarl.europa.eu/doceo/document/CRE-*": timedelta(days=30),
+    "www.europarl.europa.eu/doceo/document/": timedelta(days=7),
+    "www.europarl.europa.eu/news/fr/page/": timedelta(hours=1),
+    "www.europarl.europa.eu/plenary/": timedelta(days=1),
+    "oeil.secure.europarl.europa.eu/": timedelta(days=1),
+}
+# The documents of plenary days this recent are republished as the session
+# goes, so they are revalidated instead of read from the cache
+PLENARY_REVALIDATE = timedelta(days=14)
+FETCH_WORKERS = 8
+# Archive paths set by --record and --replay, inherited by worker processes
+RECORD_ENV = "QUIVOTEQUOI_RECORD"
+REPLAY_ENV = "QUIVOTEQUOI_REPLAY"
+# Directory where each process writes its counters with --profile, and whether
+# they also run cProfile
+PROFILE_ENV = "QUIVOTEQUOI_PROFILE"
+PROFILE_DUMP_ENV = "QUIVOTEQUOI_PROFILE_DUMP"
+VOTES_DUPLICATES_FILE = "votes_duplicates.jsonl"
+# Concurrent requests and requests per second allowed per host
+HOST_LIMITS = {
+    "www.europarl.europa.eu": (8, 10),
+    "oeil.secure.europarl.europa.eu": (4, 4),
+    "parltrack.org": (2, 1),
+}
+DEFAULT_HOST_LIMIT = (4, 4)
+HTTP_TIMEOUT = (10, 60)  # connect, read
+HTTP_RETRIES = Retry(
+    total=5,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    raise_on_status=False,
+)
 
 
 class Data(StrEnum):
@@ -39,119 +136,849 @@ class Data(StrEnum):
     ATTENDANCES = auto()
     ACTIVITIES = auto()
     NEWS = auto()
+    POSITIONS = auto()
+    STATS = auto()
+    INDEXES = auto()
+    SEARCH = auto()
+    CACHE = auto()
+
+
+# Stages reading the members of the term, which must be imported first
+MEMBERS_STAGES = {
+    Data.DOCS,
+    Data.VOTES,
+    Data.ATTENDANCES,
+    Data.ACTIVITIES,
+    Data.POSITIONS,
+    Data.STATS,
+    Data.SEARCH,
+}
 
 
-class ReadableIterator(io.IOBase):
-    def __init__(self, it):
-        self.it = iter(it)
+class CacheAction(StrEnum):
+    STATS = auto()
+    PRUNE = auto()
 
-    def read(self, n):
-        return next(self.it, b"")
+
+class LzipReader(io.RawIOBase):
+    """Raw binary stream over the decompressed chunks of an lzip file."""
+
+    def __init__(self, filename):
+        self.chunks = lzip.decompress_file_iter(filename)
+        self.pending = memoryview(b"")
 
     def readable(self):
         return True
 
+    def readinto(self, b):
+        while not self.pending:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.pending = memoryview(chunk)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        return n
+
+
+def prefetch(fn, items, workers=FETCH_WORKERS):
+    """Map `fn` over `items` in a bounded thread pool, yielding results in order.
+
+    At most `2 * workers` calls are in flight, so long inputs are not all
+    loaded in memory before the consumer catches up.
+    """
+    items = iter(items)
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque(
+            executor.submit(fn, item) for item in islice(items, 2 * workers)
+        )
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(items, 1):
+                pending.append(executor.submit(fn, item))
+            yield result
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports it in bytes, Linux in kilobytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Profile:
+    """Counters of the hot paths of a stage run with --profile.
+
+    Each process has its own, which worker processes write to the directory
+    of PROFILE_ENV when they exit, to be merged in the report.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.counters = Counter()
+        self.rows = Counter()
+        self.calls = Counter()
+        self.seconds = Counter()
+        self.profiler = None
+        if os.environ.get(PROFILE_DUMP_ENV):
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def to_dict(self):
+        return dict(
+            **self.counters,
+            times={
+                kind: dict(count=self.calls[kind], seconds=self.seconds[kind])
+                for kind in sorted(self.calls)
+            },
+            rows=dict(self.rows),
+            peak_rss=peak_rss(),
+        )
+
+    def write(self, directory):
+        directory = Path(directory)
+        (directory / f"{self.pid}.json").write_text(json.dumps(self.to_dict()))
+        if self.profiler:
+            self.profiler.disable()
+            self.profiler.dump_stats(directory / f"{self.pid}.prof")
+
+
+profile = None
+profile_lock = threading.Lock()
+
+
+def stage_profile():
+    """Profile of this process with --profile, None otherwise."""
+    global profile
+    if profile is not None and profile.pid == os.getpid():
+        return profile
+    if not (directory := os.environ.get(PROFILE_ENV)):
+        return None
+    with profile_lock:
+        if profile is None or profile.pid != os.getpid():
+            if profile and profile.profiler:  # inherited from a fork
+                profile.profiler.disable()
+            from multiprocessing.util import Finalize
+
+            profile = Profile()
+            Finalize(None, profile.write, (directory,), exitpriority=100)
+    return profile
+
+
+def count(name, n=1):
+    if p := stage_profile():
+        with p.lock:
+            p.counters[name] += n
+
+
+def count_rows(name, n=1):
+    if p := stage_profile():
+        with p.lock:
+            p.rows[name] += n
+
+
+def add_time(kind, start):
+    """Count the time since `start` as spent on `kind`."""
+    if p := stage_profile():
+        seconds = time.perf_counter() - start
+        with p.lock:
+            p.calls[kind] += 1
+            p.seconds[kind] += seconds
+
+
+@contextmanager
+def timed(kind):
+    """Count the time spent in the block, or the decorated function, on `kind`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(kind, start)
+
+
+# Spawned worker processes are profiled from the start.
+if os.environ.get(PROFILE_ENV):
+    stage_profile()
+
+
+@contextmanager
+def profiled_run(path, stage, terms=None, dump=False):
+    """Profile the stages run in the block and write a JSON report to `path`.
+
+    With `dump`, the cProfile stats of all processes are also written next to
+    it with a `.prof` suffix, and a tracemalloc snapshot of the main process
+    with a `.tracemalloc` suffix.
+    """
+    global profile
+    import tempfile
+    import tracemalloc
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ[PROFILE_ENV] = directory
+        if dump:
+            os.environ[PROFILE_DUMP_ENV] = "1"
+            tracemalloc.start()
+        profile = Profile()
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        if dump:
+            tracemalloc.take_snapshot().dump(path.with_suffix(".tracemalloc"))
+            tracemalloc.stop()
+        report = profile.to_dict()
+        workers = [
+            json.loads(shard.read_text()) for shard in Path(directory).glob("*.json")
+        ]
+        for worker in workers:
+            for name, value in worker.items():
+                if name in ("rows", "times", "peak_rss"):
+                    continue
+                report[name] = report.get(name, 0) + value
+            for name, rows in worker["rows"].items():
+                report["rows"][name] = report["rows"].get(name, 0) + rows
+            for kind, time_ in worker["times"].items():
+                total = report["times"].setdefault(kind, dict(count=0, seconds=0))
+                total["count"] += time_["count"]
+                total["seconds"] += time_["seconds"]
+        report["times"] = dict(sorted(report["times"].items()))
+        report = dict(
+            stage=stage,
+            terms=terms or [TERM],
+            seconds=seconds,
+            **report,
+            workers=len(workers),
+            workers_peak_rss=max((w["peak_rss"] for w in workers), default=0),
+        )
+        path.write_text(json.dumps(report, indent=2))
+        print(f"Profile written to {path}")
+        if profile.profiler:
+            import pstats
+
+            profile.profiler.disable()
+            stats = pstats.Stats(profile.profiler)
+            for shard in Path(directory).glob("*.prof"):
+                stats.add(str(shard))
+            stats.dump_stats(path.with_suffix(".prof"))
+        profile = None
+        os.environ.pop(PROFILE_ENV)
+        os.environ.pop(PROFILE_DUMP_ENV, None)
+
+
+class HostLimiter:
+    """Bound the number of concurrent requests and the request rate to a host."""
+
+    def __init__(self, concurrency, rate):
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.interval = 1 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        self.slots.acquire()
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def __exit__(self, *exc):
+        self.slots.release()
+
+
+host_limiters = {host: HostLimiter(*limit) for host, limit in HOST_LIMITS.items()}
+default_limiter = HostLimiter(*DEFAULT_HOST_LIMIT)
+# Number of processes importing at once, see `share_host_limits`
+HOST_SHARE = 1
+
+
+def share_host_limits(processes):
+    """Divide the host limits between `processes` importing at once.
+
+    Each process has its own limiters, so worker processes call this before
+    their first request, and their sessions then stay within their share.
+    """
+    global HOST_SHARE, host_limiters, default_limiter
+
+    def limiter(concurrency, rate):
+        return HostLimiter(max(1, concurrency // processes), rate / processes)
+
+    HOST_SHARE = processes
+    host_limiters = {host: limiter(*limit) for host, limit in HOST_LIMITS.items()}
+    default_limiter = limiter(*DEFAULT_HOST_LIMIT)
+
+
+class LimitedAdapter(HTTPAdapter):
+    """Keep-alive pool for one host, with retries and a default timeout."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        super().__init__(pool_maxsize=limiter.concurrency, max_retries=HTTP_RETRIES)
+
+    def send(self, request, timeout=None, **kwargs):
+        with self.limiter:
+            return super().send(request, timeout=timeout or HTTP_TIMEOUT, **kwargs)
+
+
+class HttpArchive:
+    """WARC file of the HTTP responses fetched by the stages.
+
+    Responses are appended to it when recording. When replaying, the
+    responses recorded for a URL are served in order, the last one repeated.
+    """
+
+    def __init__(self, path, replay=False):
+        self.path = Path(path)
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.index = {}
+        self.served = {}
+        if replay:
+            self.fd = os.open(self.path, os.O_RDONLY)
+            with open(self.path, "rb") as f:
+                while f.readline():  # WARC/1.1
+                    fields = {}
+                    while (line := f.readline()) != b"\r\n":
+                        name, value = line.decode().rstrip("\r\n").split(": ", 1)
+                        fields[name] = value
+                    length = int(fields["Content-Length"])
+                    records = self.index.setdefault(fields["WARC-Target-URI"], [])
+                    records.append((f.tell(), length))
+                    f.seek(length + 4, io.SEEK_CUR)
+
+    def record(self, response):
+        url = (response.history[0] if response.history else response).request.url
+        headers = "".join(
+            f"{name}: {value}\r\n"
+            for name, value in response.headers.items()
+            if name.lower()
+            not in ("content-encoding", "content-length", "transfer-encoding")
+        )
+        block = (
+            f"HTTP/1.1 {response.status_code} {response.reason or ''}\r\n"
+            f"{headers}Content-Length: {len(response.content)}\r\n\r\n"
+        ).encode("latin-1", "replace") + response.content
+        header = (
+            "WARC/1.1\r\n"
+            "WARC-Type: response\r\n"
+            f"WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n"
+            f"WARC-Date: {dt.now(timezone.utc):%Y-%m-%dT%H:%M:%SZ}\r\n"
+            f"WARC-Target-URI: {url}\r\n"
+            "Content-Type: application/http; msgtype=response\r\n"
+            f"Content-Length: {len(block)}\r\n\r\n"
+        )
+        # Worker processes append to the same archive.
+        with open(self.path, "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.write(header.encode() + block + b"\r\n\r\n")
+
+    def response(self, request):
+        with self.lock:
+            records = self.index.get(request.url)
+            if not records:
+                raise requests.ConnectionError(
+                    f"{request.url} is not in {self.path}", request=request
+                )
+            i = self.served.get(request.url, 0)
+            self.served[request.url] = i + 1
+            offset, length = records[min(i, len(records) - 1)]
+        head, _, body = os.pread(self.fd, length, offset).partition(b"\r\n\r\n")
+        status_line, *lines = head.decode("latin-1").split("\r\n")
+        _, status, reason = status_line.split(" ", 2)
+        response = requests.Response()
+        response.status_code = int(status)
+        response.reason = reason
+        response.headers = CaseInsensitiveDict(line.split(": ", 1) for line in lines)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Serve requests from an archive, without any network access."""
+
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        return self.archive.response(request)
+
+    def close(self):
+        pass
+
+
+archive = None
+archive_lock = threading.Lock()
+
+
+def http_archive():
+    """Archive given by --record or --replay, None when using the network."""
+    global archive
+    with archive_lock:
+        if archive is None and (path := os.environ.get(REPLAY_ENV)):
+            archive = HttpArchive(path, replay=True)
+        elif archive is None and (path := os.environ.get(RECORD_ENV)):
+            archive = HttpArchive(path)
+    return archive
+
+
+class LimitedSession(requests.Session):
+    """Session going through the per-host pools and limiters.
+
+    When recording, the responses it returns are added to the archive, and
+    when replaying they come from the archive instead.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if (archive := http_archive()) and archive.replay:
+            self.mount("https://", ReplayAdapter(archive))
+            self.mount("http://", ReplayAdapter(archive))
+            return
+        self.mount("https://", LimitedAdapter(default_limiter))
+        self.mount("http://", LimitedAdapter(default_limiter))
+        for host, limiter in host_limiters.items():
+            self.mount(f"https://{host}/", LimitedAdapter(limiter))
+
+    def request(self, method, url, *args, **kwargs):
+        start = time.perf_counter()
+        response = super().request(method, url, *args, **kwargs)
+        add_time("http", start)
+        count("requests")
+        # Responses read from the cache are not downloaded.
+        if not kwargs.get("stream"):
+            hit = getattr(response, "from_cache", False)
+            count("cache_bytes" if hit else "bytes", len(response.content))
+        archive = http_archive()
+        # Streamed responses are Parltrack dumps, too big to be archived.
+        if archive and not archive.replay and not kwargs.get("stream"):
+            archive.record(response)
+        return response
+
+
+class LRUCachedSession(CacheMixin, LimitedSession):
+    """CachedSession recording when each cached response was last used.
+
+    Access times go to an `accessed` table next to the responses, which
+    `prune_cache` uses to evict the least recently used ones.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Written by the threads sharing the session
+        self.accessed = {}
+        self.accessed_lock = threading.Lock()
+        with self.cache.responses.connection(commit=True) as con:
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS accessed"
+                " (key TEXT PRIMARY KEY, url TEXT, time INTEGER)"
+            )
+
+    def request(self, method, url, *args, **kwargs):
+        response = super().request(method, url, *args, **kwargs)
+        hit = getattr(response, "from_cache", False)
+        count("cache_hits" if hit else "cache_misses")
+        if key := getattr(response, "cache_key", None):
+            with self.accessed_lock:
+                self.accessed[key] = (url, int(time.time()))
+                full = len(self.accessed) >= 20
+            if full:
+                self.flush_accessed()
+        return response
+
+    def flush_accessed(self):
+        with self.accessed_lock:
+            accessed, self.accessed = self.accessed, {}
+        with self.cache.responses.connection(commit=True) as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO accessed VALUES (?, ?, ?)",
+                [(key, url, at) for key, (url, at) in accessed.items()],
+            )
+
+    def close(self):
+        self.flush_accessed()
+        super().close()
+
+
+http_session = None
+http_client = None
+session_lock = threading.Lock()
+
+
+def cached_session():
+    """The HTTP cache session shared by all stages of this process."""
+    global http_session
+    if (archive := http_archive()) and archive.replay:
+        return uncached_session()
+    with session_lock:
+        if http_session is None:
+            http_session = LRUCachedSession(
+                CACHE_DIR / "http_cache",
+                serializer=SerializerPipeline(
+                    [
+                        pickle_serializer,
+                        Stage(dumps=zlib.compress, loads=zlib.decompress),
+                    ],
+                    name="zlib",
+                    is_binary=True,
+                ),
+                urls_expire_after=CACHE_EXPIRY,
+                wal=True,
+            )
+            atexit.register(http_session.close)
+    return http_session
+
+
+def uncached_session():
+    """Session for requests that must not be cached, sharing the host limits."""
+    global http_client
+    with session_lock:
+        if http_client is None:
+            http_client = LimitedSession()
+            atexit.register(http_client.close)
+    return http_client
+
+
+def prune_cache(session, max_size=CACHE_MAX_SIZE):
+    """Drop expired responses, then the least recently used ones above `max_size`.
+
+    Returns the number of responses evicted for size.
+    """
+    session.cache.delete(expired=True)
+    session.flush_accessed()
+    with session.cache.responses.connection() as con:
+        rows = con.execute(
+            "SELECT responses.key, LENGTH(value) FROM responses"
+            " LEFT JOIN accessed ON accessed.key = responses.key"
+            " ORDER BY COALESCE(time, 0) DESC"
+        ).fetchall()
+    total = 0
+    evicted = []
+    for key, size in rows:
+        total += size
+        if total > max_size:
+            evicted.append(key)
+    session.cache.delete(*evicted)
+    with session.cache.responses.connection(commit=True) as con:
+        con.execute("DELETE FROM accessed WHERE key NOT IN (SELECT key FROM responses)")
+    return len(evicted)
+
+
+def cache_size(session):
+    """Compressed size of the cached responses.
+
+    The file of the cache only shrinks to it after a VACUUM.
+    """
+    with session.cache.responses.connection() as con:
+        return (
+            con.execute("SELECT SUM(LENGTH(value)) FROM responses").fetchone()[0] or 0
+        )
+
+
+def cache_stats(session):
+    """Number and compressed size of cached responses per host."""
+    session.flush_accessed()
+    with session.cache.responses.connection() as con:
+        rows = con.execute(
+            "SELECT url, LENGTH(value), expires FROM responses"
+            " LEFT JOIN accessed ON accessed.key = responses.key"
+        ).fetchall()
+    hosts = {}
+    expired = 0
+    for url, size, expires in rows:
+        host = parse.urlsplit(url).hostname if url else "(unknown)"
+        number, total = hosts.get(host, (0, 0))
+        hosts[host] = (number + 1, total + size)
+        expired += expires is not None and expires < time.time()
+    return dict(
+        responses=len(rows),
+        expired=expired,
+        size=sum(size for _, size, _ in rows),
+        file_size=session.cache.responses.size(),
+        hosts=hosts,
+    )
+
 
 def normalize(s):
     return unicodedata.normalize("NFD", s).encode("ASCII", "ignore").lower()
 
 
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Accent-folded words of `text`, like the search page splits queries."""
+    return TOKEN_RE.findall(normalize(text).decode())
+
+
+def write_search_index(documents, directory):
+    """Write an inverted index of `documents`, (text, entry) pairs, to `directory`.
+
+    Entries go to `documents.json`, and the ids of the entries holding each
+    token, delta encoded, to the `{prefix}.json` shard of the token.
+    """
+    postings = {}
+    entries = []
+    for i, (text, entry) in enumerate(documents):
+        entries.append(entry)
+        for token in set(tokenize(text)):
+            if len(token) >= SEARCH_PREFIX:
+                postings.setdefault(token, []).append(i)
+    shards = {}
+    for token in sorted(postings):
+        ids = postings[token]
+        deltas = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+        shards.setdefault(token[:SEARCH_PREFIX], {})[token] = deltas
+    directory.mkdir(parents=True, exist_ok=True)
+    for path in directory.glob("*.json"):
+        path.unlink()
+    for name, content in (("documents", entries), *shards.items()):
+        with open(directory / f"{name}.json", "w") as f:
+            json.dump(content, f, separators=(",", ":"), ensure_ascii=False)
+    return len(entries), len(postings), len(shards)
+
+
 def parse_committees(players):
     players = [com.get("europeanParliamentPlayer") for com in players]
     codes = [player.get("committeeCode") for player in players if player is not None]
     return [code for code in codes if code is not None]
 
 
-def fetch_proc(ref):
-    sess = CachedSession()
-    sess.cookies.update({"oeilLanguage": "fr"})
-    url = f"https://oeil.secure.europarl.europa.eu/oeil/popups/ficheprocedure.do?reference={ref}&l=fr"
-    try:
-        request = sess.get(url)
-        request.raise_for_status()
-        html = bs4.BeautifulSoup(request.content, features="lxml")
-    except:
-        return {}
-    tag = html.find(string="Subject")
+def parse_html(content):
+    """lxml tree of an EP or OEIL page, which are all in UTF-8."""
+    html = etree.fromstring(content, lxml.html.HTMLParser(encoding="utf-8"))
+    return lxml.html.fromstring("<html></html>") if html is None else html
+
+
+def with_class(name):
+    """XPath predicate on elements having the class `name`."""
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+def following(html, label, path):
+    """Elements of `path` from the first `label` string, in document order."""
+    return html.xpath(f"(//text()[. = $label])[1]/following::{path}", label=label)
+
+
+def sibling_strings(html, label):
+    """Strings next to the element holding the first `label` string, up to a <strong>."""
+    for text in html.xpath("(//text()[. = $label])[1]", label=label):
+        parent = text.getparent()
+        if text.is_tail:
+            parent = parent.getparent()
+        if parent.tail:
+            yield parent.tail
+        for elem in parent.itersiblings():
+            if elem.tag == "strong":
+                break
+            if elem.tail:
+                yield elem.tail
+
+
+def parse_proc(html, url):
+    """Fields of the OEIL page of a procedure."""
     subjects = set()
-    if tag:
-        for elem in tag.parent.next_siblings:
-            match elem.name:
-                case None:
-                    subject = elem.text.strip().split(" ")[0]
-                    if subject:
-                        subjects.add(subject)
-                case "strong":
-                    break
-    tag = html.find(string="Geographical area")
+    for text in sibling_strings(html, "Subject"):
+        if subject := text.strip().split(" ")[0]:
+            subjects.add(subject)
     countries = set()
-    if tag:
-        for elem in tag.parent.next_siblings:
-            match elem.name:
-                case None:
-                    country = elem.text.strip().split(",")[0]
-                    if country:
-                        countries.add(coco.convert(country, to="ISO2", not_found=None))
-                case "strong":
-                    break
+    for text in sibling_strings(html, "Geographical area"):
+        if country := text.strip().split(",")[0]:
+            countries.add(coco.convert(country, to="ISO2", not_found=None))
     for subject in list(subjects):
         parts = subject.split(".")
         for i in range(len(parts)):
             subjects.add(".".join(parts[: i + 1]))
     committees = None
-    try:
-        committees = [span.text for span in html.find(string="Acteurs principaux").find_next('table').find_all(class_='erpl_badge-committee')]     
-    except:
-        pass   
+    if table := following(html, "Acteurs principaux", "table[1]"):
+        committees = [
+            span.text_content()
+            for span in table[0].xpath(f".//*[{with_class('erpl_badge-committee')}]")
+        ]
+    events = following(html, "Evénements clés", "table[1]")[0]
+    documentation = following(html, "Portail de documentation", "table[1]")[0]
     return dict(
-        reference=html.find(class_="erpl_title-h1").text.replace("&nbsp;", " "),
-        date=parsedate(html.find(string="Evénements clés").find_next('table').select_one('tr:last-child td').text),
-        title=html.find(class_="erpl_title-h2").text.replace("&nbsp;", " "),
-        type=html.find(string="Type de procédure").find_next('td').text.split(' - ')[0],
+        reference=html.xpath(f"//*[{with_class('erpl_title-h1')}]")[0]
+        .text_content()
+        .replace("&nbsp;", " "),
+        date=parsedate(
+            events.xpath("(.//tr[not(following-sibling::*)]//td)[1]")[0].text_content()
+        ),
+        title=html.xpath(f"//*[{with_class('erpl_title-h2')}]")[0]
+        .text_content()
+        .replace("&nbsp;", " "),
+        type=following(html, "Type de procédure", "td[1]")[0]
+        .text_content()
+        .split(" - ")[0],
         subjects=json.dumps(list(subjects)),
         countries=json.dumps(list(countries)),
         committees=json.dumps(committees),
-        docs=json.dumps([td.text for td in html.find(string="Portail de documentation").find_next('table').select('td:nth-child(2)')]),
-        status=html.find(string="Statut").find_next('p').text,
+        docs=json.dumps(
+            [
+                td.text_content()
+                for td in documentation.xpath(".//td[count(preceding-sibling::*) = 1]")
+            ]
+        ),
+        status=following(html, "Statut", "p[1]")[0].text_content(),
         url=url,
     )
 
 
+def fetch_proc(ref):
+    url = f"https://oeil.secure.europarl.europa.eu/oeil/popups/ficheprocedure.do?reference={ref}&l=fr"
+    try:
+        request = cached_session().get(url, cookies={"oeilLanguage": "fr"})
+        request.raise_for_status()
+        start = time.perf_counter()
+        html = parse_html(request.content)
+    except:
+        return {}
+    proc = parse_proc(html, url)
+    add_time("oeil", start)
+    return proc
+
+
 def download_if_new(filename):
+    """Download a Parltrack dump unless the local copy is up to date.
+
+    The request is conditional on the mtime and ETag of the local dump. The
+    body goes to a `.part` file, resumed with a Range request after an
+    interruption, which is then atomically renamed over the dump.
+    """
+    if (archive := http_archive()) and archive.replay:
+        print(f"Replaying {archive.path}, using the local {filename}")
+        return
     url = PARLTRACK_DUMPS_URL + filename
-    res = requests.get(url, stream=True)
     local_file = Path(filename)
+    etag_file = Path(filename + ".etag")
+    part_file = Path(filename + ".part")
+    part_etag_file = Path(filename + ".part.etag")
+
+    headers = {}
     if local_file.exists():
-        url_dt = parsedate(res.headers["last-modified"])
         file_dt = dt.fromtimestamp(local_file.stat().st_mtime, tz=timezone.utc)
-        if url_dt < file_dt:
+        headers["If-Modified-Since"] = format_datetime(file_dt, usegmt=True)
+        if etag_file.exists():
+            headers["If-None-Match"] = etag_file.read_text()
+    offset = part_file.stat().st_size if part_file.exists() else 0
+    if offset and part_etag_file.exists():
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = part_etag_file.read_text()
+
+    with uncached_session().get(url, headers=headers, stream=True) as res:
+        if res.status_code == 416:  # stale or complete partial download
+            part_file.unlink()
+            return download_if_new(filename)
+        res.raise_for_status()
+        last_modified = res.headers.get("last-modified")
+        url_dt = parsedate(last_modified) if last_modified else None
+        if res.status_code == 304 or (
+            local_file.exists() and url_dt and url_dt <= file_dt
+        ):
             print(f"No new version of {filename}. Skipping download.")
             return
-    print("Downloading new version...")
-    bar = tqdm(
-        total=int(res.headers["content-length"]),
-        desc=f"Downloading {filename} from Parltrack",
-        unit="B",
-        unit_scale=True,
-        unit_divisor=1024,
-        miniters=1,
-    )
-    with local_file.open("wb") as f:
-        for chunk in res.iter_content(chunk_size=1024):
-            size = f.write(chunk)
-            bar.update(size)
-
-
-def read_json(filename):
+        if res.status_code != 206:
+            offset = 0
+            validator = res.headers.get("etag") or last_modified
+            if validator:
+                part_etag_file.write_text(validator)
+        print("Downloading new version..." if not offset else "Resuming download...")
+        # Expected size of the complete dump, unknown without these headers
+        # (chunked responses) and then not checked.
+        size = None
+        if content_range := res.headers.get("content-range"):
+            total = content_range.rpartition("/")[2]
+            size = int(total) if total.isdigit() else None
+        elif length := res.headers.get("content-length"):
+            size = offset + int(length)
+        bar = tqdm(
+            total=size or None,
+            initial=offset,
+            desc=f"Downloading {filename} from Parltrack",
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            miniters=1,
+        )
+        mode = "ab" if offset else "wb"
+        with bar, part_file.open(mode, buffering=DOWNLOAD_CHUNK_SIZE) as f:
+            for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                bar.update(f.write(chunk))
+                count("bytes", len(chunk))
+
+    if size and part_file.stat().st_size != size:
+        raise IOError(f"Incomplete download of {filename}, run again to resume")
+    part_file.replace(local_file)
+    part_etag_file.unlink(missing_ok=True)
+    if etag := res.headers.get("etag"):
+        etag_file.write_text(etag)
+    if url_dt:
+        os.utime(local_file, (url_dt.timestamp(), url_dt.timestamp()))
+
+
+def key_filter(key, values):
+    """Build a `read_json` prefilter keeping records whose `key` is in `values`.
+
+    Only the first `"key": <int>` of the raw line is looked at, which is the
+    record's own id in Parltrack dumps. Lines without it are kept.
+    """
+    pattern = re.compile(rb'"%s":\s*(\d+)' % re.escape(key.encode()))
+    values = set(map(int, values))
+
+    def prefilter(line):
+        match = pattern.search(line)
+        return match is None or int(match[1]) in values
+
+    return prefilter
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` across processes."""
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_json(filename, prefilter=None):
+    """Stream the records of a Parltrack dump.
+
+    `prefilter` is called on the raw bytes of each record and records it
+    rejects are skipped without being decoded.
+    """
     filename += ".lz"
-    download_if_new(filename)
-    stream = ReadableIterator(lzip.decompress_file_iter(filename))
+    # Imports of several terms share the dumps.
+    with file_lock(filename + ".lock"):
+        download_if_new(filename)
     print(f"Processing {filename}...")
-    with io.TextIOWrapper(stream) as f:
+    size = 0
+    start = time.perf_counter()
+    bar = tqdm(desc=f"Reading {filename}", unit="B", unit_scale=True, unit_divisor=1024)
+    with bar, io.BufferedReader(LzipReader(filename), 1 << 20) as f:
         for line in f:
-            if line == "]":
-                return
-            yield json.loads(line[1:])
+            size += len(line)
+            bar.update(len(line))
+            if line.rstrip() == b"]":
+                break
+            if prefilter is None or prefilter(line):
+                yield json_loads(line[1:])
+    elapsed = time.perf_counter() - start
+    count("dump_bytes", size)
+    print(
+        f"Read {size / 1e6:.1f} MB from {filename} in {elapsed:.1f}s"
+        f" ({size / 1e6 / elapsed:.1f} MB/s)"
+    )
 
 
 def extract_table(page):
@@ -170,14 +997,50 @@ def extract_table(page):
     return []
 
 
+@timed("pdf")
+def extract_pages(content, start, stop):
+    """Table rows of the pages `start` to `stop` of a PDF."""
+    with pp.open(io.BytesIO(content)) as pdf:
+        return [row for page in pdf.pages[start:stop] for row in extract_table(page)]
+
+
+pdf_locks = {}
+
+
+def extract_pdf_rows(content, pool=None):
+    """Table rows of every page of a PDF, cached on disk by content hash.
+
+    Pages are extracted in chunks of `PDF_PAGES_PER_TASK` on `pool` when given.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    cache_file = CACHE_DIR / "pdf_tables" / f"{digest}.json"
+    with pdf_locks.setdefault(digest, threading.Lock()):
+        if cache_file.exists():
+            return json.loads(cache_file.read_text())
+        with pp.open(io.BytesIO(content)) as pdf:
+            nb_pages = len(pdf.pages)
+        starts = range(0, nb_pages, PDF_PAGES_PER_TASK)
+        stops = [start + PDF_PAGES_PER_TASK for start in starts]
+        chunks = (pool.map if pool else map)(
+            extract_pages, [content] * len(starts), starts, stops
+        )
+        rows = [row for chunk in chunks for row in chunk]
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps(rows))
+        tmp_file.replace(cache_file)
+        return rows
+
+
 def flag_from_iso(code):
     return chr(0x1F1A5 + ord(code[0])) + chr(0x1F1A5 + ord(code[1]))
 
 
 def extract_amendments(table):
-    with open("_data/members.csv") as csvfile:
-        reader = csv.DictReader(csvfile)
-        meps = {mep["full_name"].title(): int(mep["id"]) for mep in reader}
+    meps = {
+        mep["full_name"].title(): int(mep["id"])
+        for mep in read_rows("members", "id", "full_name")
+    }
 
     nr = None
     start = False
@@ -233,17 +1096,448 @@ def extract_amendments(table):
         )
 
 
-def dicts_to_csv(dicts, filename):
-    with open(f"_data/{filename}.csv", "w") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=dicts[0].keys())
+WORD_RE = re.compile(r"\w+|\W+")
+
+
+def js_length(text):
+    """Length of `text` in JavaScript, which counts UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def word_diff(old, new):
+    """Changes from `old` to `new` word by word, as [op, length] runs.
+
+    op is -1 for text deleted from `old`, 1 for text inserted from `new` and
+    0 for text unchanged in both. Runs follow each other in both texts, so
+    the site slices the texts back with their lengths, counted as in
+    JavaScript. Separators left alone between two changes are folded into
+    them.
+    """
+    a = WORD_RE.findall(old)
+    b = WORD_RE.findall(new)
+    opcodes = difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+    changes = []
+    deleted = inserted = 0
+    for i, (tag, a1, a2, b1, b2) in enumerate(opcodes):
+        text = "".join(a[a1:a2])
+        inner = 0 < i < len(opcodes) - 1
+        if tag == "equal" and not (inner and not re.search(r"\w", text)):
+            if deleted:
+                changes.append([-1, deleted])
+            if inserted:
+                changes.append([1, inserted])
+            changes.append([0, js_length(text)])
+            deleted = inserted = 0
+        else:
+            deleted += js_length(text)
+            inserted += js_length("".join(b[b1:b2]))
+    if deleted:
+        changes.append([-1, deleted])
+    if inserted:
+        changes.append([1, inserted])
+    return changes
+
+
+@contextmanager
+def diff_cache(path=DIFF_CACHE_FILE):
+    """`word_diff` memoized on disk by a hash of its arguments.
+
+    Only the diffs looked up during the block are kept in `path`.
+    """
+    cached = json.loads(path.read_text()) if path.exists() else {}
+    used = {}
+
+    def diff(old, new):
+        key = hashlib.sha256(json.dumps([old, new]).encode()).hexdigest()
+        if key not in used:
+            hit = key in cached
+            count("diff_cache_hits" if hit else "diff_cache_misses")
+            used[key] = cached[key] if hit else word_diff(old, new)
+        return used[key]
+
+    yield diff
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_suffix(".tmp")
+    tmp_file.write_text(json.dumps(used, separators=(",", ":"), ensure_ascii=False))
+    tmp_file.replace(path)
+
+
+def open_db(path):
+    """SQLite engine in WAL mode with the tables of `models` created."""
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    models.Base.metadata.create_all(engine)
+    return engine
+
+
+def to_db(table, row, index):
+    """Convert a CSV row, as written or as read back, to the column types of `table`."""
+    values = dict(row=index)
+    for column in table.columns:
+        if column.name == "row":
+            continue
+        value = row.get(column.name)
+        python_type = column.type.python_type
+        if value is None or (value == "" and python_type is not str):
+            value = None
+        elif python_type is bool and isinstance(value, str):
+            value = value == "True"
+        elif python_type is date and isinstance(value, str):
+            value = date.fromisoformat(value)
+        elif python_type is dt and isinstance(value, str):
+            value = dt.fromisoformat(value)
+        elif python_type in (int, str):
+            value = python_type(value)
+        values[column.name] = value
+    return values
+
+
+def read_position_members():
+    """Member ids in the order used by compact positions."""
+    try:
+        with open(DATA_DIR / POSITION_MEMBERS_FILE) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+
+def encode_positions(positions, columns):
+    """Compact form of a {member_id: position} dict, given member columns."""
+    chars = ["."] * len(columns)
+    for member_id, position in positions.items():
+        chars[columns[int(member_id)]] = POSITION_CHARS[position]
+    return "".join(chars)
+
+
+def decode_positions(value, member_ids=None):
+    """{member_id: position} dict of a JSON or compact positions field."""
+    if not value:
+        return {}
+    if value.startswith("{"):
+        return json.loads(value)
+    if member_ids is None:
+        member_ids = read_position_members()
+    names = {char: name for name, char in POSITION_CHARS.items()}
+    return {
+        str(member_ids[i]): names[char] for i, char in enumerate(value) if char in names
+    }
+
+
+def vote_positions(votes):
+    member_ids = read_position_members()
+    for vote in votes:
+        for member_id, position in decode_positions(
+            vote["positions"], member_ids
+        ).items():
+            yield dict(
+                vote_row=vote["row"],
+                member_id=int(member_id),
+                position=models.Position.Position[position],
+            )
+
+
+class CountingDictWriter(csv.DictWriter):
+    """csv.DictWriter counting the rows of the `name` output, with --profile."""
+
+    def __init__(self, name, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    def writeheader(self):
+        return self.writer.writerow(self.fieldnames)
+
+    def writerow(self, rowdict):
+        count_rows(self.name)
+        return super().writerow(rowdict)
+
+    def writerows(self, rowdicts):
+        for rowdict in rowdicts:
+            self.writerow(rowdict)
+
+
+class TableWriter:
+    """Drop-in for csv.DictWriter that bulk inserts rows into a table of `DB`.
+
+    Like the CSV file it replaces, the table is rewritten: it is emptied when
+    opened, and the CSV is exported from it on `close`.
+    """
+
+    def __init__(self, name, fieldnames):
+        self.table = models.Base.metadata.tables[name]
+        self.fieldnames = fieldnames
+        self.batch = []
+        self.count = 0
+        with DB.begin() as conn:
+            if name == "votes":
+                conn.execute(delete(models.Position.__table__))
+            conn.execute(delete(self.table))
+
+    def writeheader(self):
+        pass
+
+    def writerow(self, row):
+        self.batch.append(to_db(self.table, row, self.count))
+        self.count += 1
+        if len(self.batch) >= DB_BATCH_SIZE:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if not self.batch:
+            return
+        with DB.begin() as conn:
+            conn.execute(insert(self.table), self.batch)
+            if self.table.name == "votes":
+                positions = list(vote_positions(self.batch))
+                if positions:
+                    conn.execute(insert(models.Position.__table__), positions)
+        self.batch = []
+
+    def close(self):
+        self.flush()
+        count_rows(self.table.name, self.count)
+        columns = [self.table.c[name] for name in self.fieldnames]
+        query = select(*columns).order_by(self.table.c.row)
+        with (
+            DB.connect() as conn,
+            open(DATA_DIR / f"{self.table.name}.csv", "w") as csvfile,
+        ):
+            writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
+            writer.writeheader()
+            for row in conn.execution_options(yield_per=DB_BATCH_SIZE).execute(query):
+                writer.writerow(row._asdict())
+
+
+@contextmanager
+def open_table(name, fieldnames):
+    """Writer for the `name` output of a stage.
+
+    Rows go to `{DATA_DIR}/{name}.csv`, or through the `name` table when a
+    database is used.
+    """
+    if DB is None:
+        with open(DATA_DIR / f"{name}.csv", "w") as csvfile:
+            if stage_profile():
+                yield CountingDictWriter(name, csvfile, fieldnames=fieldnames)
+            else:
+                yield csv.DictWriter(csvfile, fieldnames=fieldnames)
+    else:
+        writer = TableWriter(name, fieldnames)
+        yield writer
+        writer.close()
+
+
+def read_rows(name, *columns, where=()):
+    """Rows of the `name` output of a stage, as csv.DictReader returns them.
+
+    `where` holds (column, operator, value) conditions on the rows, such as
+    `("date", operator.lt, resume)`. Without a database, they compare the CSV
+    text with `str(value)`. With a database, this is a query on the `name`
+    table restricted to `columns`, whose conditions use the column indexes,
+    instead of a scan of the whole CSV file.
+    """
+    if DB is None:
+        with open(DATA_DIR / f"{name}.csv") as csvfile:
+            for row in csv.DictReader(csvfile):
+                if all(op(row[column], str(value)) for column, op, value in where):
+                    yield row
+        return
+    table = models.Base.metadata.tables[name]
+    selected = [table.c[column] for column in columns] or [
+        column for column in table.columns if column.name != "row"
+    ]
+    query = select(*selected).order_by(table.c.row)
+    for column, op, value in where:
+        query = query.where(op(table.c[column], value))
+    with DB.connect() as conn:
+        for row in conn.execution_options(yield_per=DB_BATCH_SIZE).execute(query):
+            yield {k: "" if v is None else str(v) for k, v in row._asdict().items()}
+
+
+def last_value(name, column):
+    """Largest value of `column` in the `name` output, as text, None if empty.
+
+    With a database, it is read from the index of the column.
+    """
+    if DB is None:
+        return max((row[column] for row in read_rows(name)), default=None)
+    table = models.Base.metadata.tables[name]
+    with DB.connect() as conn:
+        value = conn.execute(select(func.max(table.c[column]))).scalar()
+    return None if value is None else str(value)
+
+
+def load_positions():
+    """Roll-call votes, member ids and the int8 matrix of their positions.
+
+    Rows of the matrix follow the votes and columns the sorted member ids,
+    cells hold `POSITION_CODES` or 0 when the member did not vote.
+    """
+    import numpy as np
+
+    votes = [vote for vote in read_rows("votes") if vote["positions"]]
+    member_ids = sorted(int(mep["id"]) for mep in read_rows("members", "id"))
+    columns = {member_id: i for i, member_id in enumerate(member_ids)}
+    matrix = np.zeros((len(votes), len(member_ids)), dtype=np.int8)
+    position_members = read_position_members()
+    for i, vote in enumerate(votes):
+        for member_id, position in decode_positions(
+            vote["positions"], position_members
+        ).items():
+            if (j := columns.get(int(member_id))) is not None:
+                matrix[i, j] = POSITION_CODES[position]
+    return votes, member_ids, matrix
+
+
+def read_positions(path=None):
+    """Vote table, member ids and position matrix written by the `positions` stage."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path or DATA_DIR / "positions.parquet")
+    member_ids = json.loads(table.schema.metadata[b"member_ids"])
+    positions = table["positions"].combine_chunks().flatten().to_numpy()
+    return (
+        table.drop_columns("positions"),
+        member_ids,
+        positions.reshape(-1, len(member_ids)),
+    )
+
+
+def group_stats(votes, member_ids, matrix):
+    """Group lines, member loyalty and rebel votes over a position matrix.
+
+    Members belong to the group whose interval in `members.csv` contains the
+    vote date, end date included: on a day ending one group and starting
+    another, the group starting wins. The line of a group on a vote is the
+    position most of its members took, or 0 on a tie, counted over the whole
+    group in the roll-call (`group_votes`). Votes imported without these
+    counts have no lines. Returns the group ids, the (votes x members) group
+    index (-1 for none), the (votes x groups x positions) counts and the
+    (votes x groups) lines.
+    """
+    import numpy as np
+
+    members = {int(mep["id"]): mep for mep in read_rows("members", "id", "groups")}
+    vote_dates = np.array([vote["date"] for vote in votes], dtype="datetime64[D]")
+    intervals = sorted(
+        (
+            (j, group["groupid"], group["start"][:10], group["end"][:10])
+            for j, member_id in enumerate(member_ids)
+            for group in json.loads(members[member_id]["groups"])
+        ),
+        key=lambda interval: interval[2],
+    )
+    group_votes = [json.loads(vote.get("group_votes") or "{}") for vote in votes]
+    group_ids = sorted(
+        set(group_id for _, group_id, _, _ in intervals).union(*group_votes)
+    )
+    index = {group_id: g for g, group_id in enumerate(group_ids)}
+    membership = np.full(matrix.shape, -1, dtype=np.int8)
+    for j, group_id, start, end in intervals:
+        start, end = np.datetime64(start), np.datetime64(end)
+        during = (start <= vote_dates) & (vote_dates <= end)
+        membership[during, j] = index[group_id]
+
+    counts = np.zeros((len(votes), len(group_ids), len(POSITION_CODES)), np.int32)
+    for i, by_group in enumerate(group_votes):
+        for group_id, numbers in by_group.items():
+            counts[i, index[group_id]] = numbers
+    top = counts.max(axis=2, keepdims=True)
+    unique = (counts == top).sum(axis=2) == 1
+    lines = np.where(unique & (top[:, :, 0] > 0), counts.argmax(axis=2) + 1, 0)
+    return group_ids, membership, counts, lines
+
+
+def dicts_to_csv(dicts, filename, fieldnames):
+    with open(DATA_DIR / f"{filename}.csv", "w") as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(dicts)
+    count_rows(filename, len(dicts))
+
+
+def write_indexes():
+    """Write the indexes of the records the templates look up.
+
+    They hold row numbers into the CSV data files, so that templates look
+    records up instead of filtering whole files on every page. Stages
+    rewriting one of these files write them again, and outputs not imported
+    yet count as empty.
+    """
+
+    def rows(name, *columns):
+        try:
+            return list(read_rows(name, *columns))
+        except FileNotFoundError:
+            return []
+
+    docs = rows("docs", "ref", "procedure")
+    votes = rows("votes", "doc", "positions")
+    position_members = read_position_members()
+    amendments = rows("amendments", "doc", "nr", "authors")
+    # News are not stored in the database.
+    try:
+        with open(DATA_DIR / "news.csv") as csvfile:
+            news = list(csv.DictReader(csvfile))
+    except FileNotFoundError:
+        news = []
+
+    procedures = {}
+    doc_procedures = {}
+    for i, doc in enumerate(docs):
+        doc_procedures.setdefault(doc["ref"], []).append(doc["procedure"])
+        index = procedures.setdefault(
+            doc["procedure"], dict(docs=[], votes=[], news=[])
+        )
+        index["docs"].append(i)
+    members = {}
+    for i, vote in enumerate(votes):
+        for ref in dict.fromkeys(doc_procedures.get(vote["doc"], [])):
+            procedures[ref]["votes"].append(i)
+        for member_id in decode_positions(vote["positions"], position_members):
+            index = members.setdefault(member_id, dict(votes=[], amendments=[]))
+            index["votes"].append(i)
+    for i, article in enumerate(news):
+        for ref in json.loads(article["refs"]):
+            if ref in procedures:
+                procedures[ref]["news"].append(i)
+    amendment_index = {}
+    for i, amd in enumerate(amendments):
+        amendment_index.setdefault(f"{amd['doc']}#{amd['nr']}", i)
+        for member_id in json.loads(amd["authors"]):
+            index = members.setdefault(str(member_id), dict(votes=[], amendments=[]))
+            index["amendments"].append(i)
+
+    for name, index in (
+        ("procedure_index", procedures),
+        ("member_index", members),
+        ("amendment_index", amendment_index),
+    ):
+        with open(DATA_DIR / f"{name}.json", "w") as f:
+            json.dump(index, f, separators=(",", ":"))
 
 
 EP_URL = "https://www.europarl.europa.eu"
 
 
-def fetch_doc(doc):
+def parse_doc(html):
+    """Procedure of the page of a document, None if missing, and its amendment PDFs."""
+    procedure = next(
+        (extract_ref(text) for text in html.itertext() if PROC_RE.search(text)), None
+    )
+    hrefs = html.xpath('(//*[@id="amdData"])[1]//a[@aria-label="pdf"]/@href')
+    return procedure, [EP_URL + href for href in hrefs]
+
+
+def fetch_doc(doc, pool=None):
     parts = doc.split("-")
     term = parts[-2][1:]
     nr, year = parts[-1].split("/")
@@ -252,49 +1546,56 @@ def fetch_doc(doc):
     else:
         doc_type = parts[0][0]
         url = f"https://www.europarl.europa.eu/doceo/document/{doc_type}-{term}-{year}-{nr}_FR.html"
-    session = CachedSession()
+    session = cached_session()
     try:
         request = session.get(url)
         request.raise_for_status()
     except requests.HTTPError:
         print(url)
         return doc
-    html = bs4.BeautifulSoup(request.content, features="lxml")
-    amendments = []
-    try:
-        procedure = extract_ref(html.find(string=PROC_RE).text)
-    except:
+    start = time.perf_counter()
+    procedure, pdf_urls = parse_doc(parse_html(request.content))
+    add_time("doc", start)
+    if procedure is None:
         print(url)
         return None
-    if amd_data := html.find(id="amdData"):
-        for a in amd_data.find_all("a", attrs={"aria-label": "pdf"}):
-            pdf_url = EP_URL + a.attrs["href"]
-            tmp = io.BytesIO(session.get(pdf_url).content)
-            pdf = pp.open(tmp)
-            for amd in extract_amendments(
-                [row for table in map(extract_table, pdf.pages) for row in table]
-            ):
-                amd["url"] = pdf_url
-                amendments.append(amd)
+    amendments = []
+    for pdf_url in pdf_urls:
+        rows = extract_pdf_rows(session.get(pdf_url).content, pool)
+        for amd in extract_amendments(rows):
+            amd["url"] = pdf_url
+            amendments.append(amd)
     return dict(ref=doc, procedure=procedure, url=url), amendments
 
 
 def process_table(table, header=True):
+    """Rows of a VOT XML table, as dicts keyed by the header row if `header`.
+
+    The cells of each row are read in a single pass and placed by their
+    COLNAME. A cell spanning several columns is followed by empty cells
+    (except in the header row), one spanning several rows is repeated at the
+    same index in the rows below.
+    """
     rows = []
     rowspans = {}
     col_nb = int(table.find("COLGROUP").get("COLNB"))
-    for tr in table.findall("TBODY/TR"):
+    indexes = {f"C{i + 1}": i for i in range(col_nb)}
+    for tr in table.iterfind("TBODY/TR"):
+        tds = [None] * col_nb
+        for td in tr.iterfind("TD"):
+            i = indexes.get(td.get("COLNAME"))
+            if i is not None and tds[i] is None:
+                tds[i] = td
         row = []
-        i = 0
-        while i < col_nb:
-            td = tr.find(f"TD[@COLNAME='C{i+1}']")
+        for i, td in enumerate(tds):
             if td is not None:
                 row.append(" ".join(td.itertext()).replace("\xa0", " "))
-                if "COLSPAN" in td.keys() and len(rows) > 0:  # skip colspan in header
-                    cols_to_add = int(td.get("COLSPAN")) - 1
-                    row.extend(cols_to_add * [None])
-                if "ROWSPAN" in td.keys():
-                    rowspans[i] = int(td.get("ROWSPAN")) - 1
+                colspan = td.get("COLSPAN")
+                if colspan is not None and rows:  # skip colspan in header
+                    row.extend((int(colspan) - 1) * [None])
+                rowspan = td.get("ROWSPAN")
+                if rowspan is not None:
+                    rowspans[i] = int(rowspan) - 1
             elif i in rowspans:
                 rowspan = rowspans[i]
                 row.append(rows[-1][i])
@@ -304,27 +1605,23 @@ def process_table(table, header=True):
                     rowspans[i] = rowspan - 1
             else:
                 row.append(None)
-            i += 1
         rows.append(row)
     if len(rows) == 0:
         return []
     if header:
-        header = rows[0]
-        return [
-            {
-                col_name.replace("\t", ""): row[i]
-                for i, col_name in enumerate(header)
-                if col_name
-            }
-            for row in rows[1:]
+        columns = [
+            (i, col_name.replace("\t", ""))
+            for i, col_name in enumerate(rows[0])
+            if col_name
         ]
+        return [{col_name: row[i] for i, col_name in columns} for row in rows[1:]]
     return rows
 
 
 def get_dates():
-    session = CachedSession()
+    session = cached_session()
     response = session.get(
-        "https://www.europarl.europa.eu/plenary/fr/ajax/getSessionCalendar.html?family=PV&termId=10"
+        f"https://www.europarl.europa.eu/plenary/fr/ajax/getSessionCalendar.html?family=PV&termId={TERM}"
     ).json()
     term_start = dt.strptime(response["startDate"], "%d/%m/%Y").date()
     term_end = dt.strptime(response["endDate"], "%d/%m/%Y").date()
@@ -350,7 +1647,7 @@ def get_dates():
         sessions.add((start, end))
 
     out = []
-    for sess_start, sess_end in sessions:
+    for sess_start, sess_end in sorted(sessions):
         dates = []
         tmp_date = sess_start
         while term_start <= tmp_date <= term_end and tmp_date <= sess_end:
@@ -360,14 +1657,97 @@ def get_dates():
     return out
 
 
+def plenary_options(session, vote_date):
+    """Options of the requests for the documents of a plenary day."""
+    recent = date.today() - vote_date <= PLENARY_REVALIDATE
+    return dict(refresh=True) if recent and isinstance(session, CacheMixin) else {}
+
+
+def fetch_plenary_day(session, vote_date):
+    """Fetch the VOT, RCV and PV documents of a plenary day.
+
+    Returns their contents in that order. Like the `votes` stage always did, a
+    missing VOT or RCV document stops the fetch and the remaining ones are None.
+    """
+    contents = [None, None, None]
+    day = vote_date.strftime("%Y-%m-%d")
+    options = plenary_options(session, vote_date)
+    for i, suffix in enumerate(("-VOT_FR.xml", "-RCV_FR.xml", "_FR.html")):
+        request = session.get(f"{EP_BASE_URL}PV-{TERM}-{day}{suffix}", **options)
+        if i < 2:
+            try:
+                request.raise_for_status()
+            except requests.HTTPError:
+                break
+        contents[i] = request.content
+    return contents
+
+
+def fetch_attendance(session, vote_date):
+    """Content of the attendance register of a plenary day, None if missing."""
+    url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}-ATT_FR.html"
+    try:
+        request = session.get(url, **plenary_options(session, vote_date))
+        request.raise_for_status()
+    except requests.HTTPError:
+        print(url)
+        return None
+    return request.content
+
+
+@timed("attendance")
+def attendees(content):
+    """Normalized names listed as present on an attendance register page."""
+    names = set()
+    for p in parse_html(content).xpath(f"//p[{with_class('contents')}]"):
+        text = p.text_content()
+        if ":" not in text:
+            names.update(normalize(name.strip()) for name in text.split(", "))
+    return names
+
+
+def fetch_speech(session, url):
+    """Paragraphs of a CRE speech, reading only the PARA elements of its XML."""
+    content = session.get(url).content.replace(b"&nbsp;", b" ")
+    start = time.perf_counter()
+    paragraphs = []
+    for _, elem in ET.iterparse(io.BytesIO(content)):
+        if elem.tag == "PARA" and elem.text:
+            paragraphs.append(elem.text)
+        elem.clear()
+    add_time("speech", start)
+    return paragraphs
+
+
+def fetch_article(session, url, title):
+    """Summary of a news article about procedures, None if it has no facts."""
+    request = session.get(url)
+    start = time.perf_counter()
+    html = bs4.BeautifulSoup(request.content, features="lxml")
+    spans = html.find_all(string=re.compile("Fiche de procédure"))
+    hrefs = [span.find_parent("a").attrs["href"] for span in spans]
+    refs = [extract_ref(parse.unquote(href)) for href in hrefs if href]
+    facts = [e.get_text(strip=True) for e in html.select(".ep-a_facts .ep-p_text")]
+    add_time("news", start)
+    if refs and facts:
+        return dict(
+            title=title,
+            refs=json.dumps(refs),
+            facts=json.dumps(facts),
+            url=url,
+        )
+
+
 def parse_group(group):
     match group:
         case "Renew":
             return "RE"
-        case "Patriots for Europe Group" | "ENF" | "ID":
+        case "Patriots for Europe Group" | "PfE" | "ENF" | "ID":
             return "P4E"
-        case "Europe of Sovereign Nations Group":
+        case "Europe of Sovereign Nations Group" | "ESN":
             return "ENS"
+        case "NI":
+            return "NA"
         case "PPE-DE":
             return "PPE"
         case "The Left":
@@ -531,11 +1911,505 @@ def parse_title(text):
     return loc, amendment, split
 
 
-def main(data: Data):
+VOTE_KEY = ("sess_date", "doc", "amendment", "split", "type", "votes")
+# Columns of a VOT vote identifying it when it is repeated on later days
+VOT_DEDUP_KEY = (
+    "doc",
+    "subject",
+    "author",
+    "type",
+    "rcv",
+    "split",
+    "amendment",
+    "result",
+    "votes",
+)
+
+
+def vot_dedup_key(vote):
+    """Dedup key of a VOT vote, the same for its record and its row read back."""
+    return tuple(
+        None if vote.get(column) in (None, "") else str(vote.get(column))
+        for column in VOT_DEDUP_KEY
+    )
+
+
+def merge_votes(votes, votings):
+    """Full outer join of a session's VOT results with its RCV votings.
+
+    Matches the former pandas merge on `VOTE_KEY`: rows come sorted by key
+    with missing values last, RCV columns also found in the results get a
+    `_rcv` suffix and the RCV date wins when both sides match. Nothing is
+    returned unless both sides have votes. Records repeating a key already
+    seen on their side are left out and returned as duplicates.
+    """
+    columns = {column for vote in votes for column in vote}
+    duplicates = []
+    index = {}
+    for voting in votings:
+        if voting.get("type") == "IGNORE":
+            continue
+        key = tuple(voting.get(column) for column in VOTE_KEY)
+        if key in index:
+            duplicates.append(voting)
+        else:
+            index[key] = voting
+
+    merged = {}
+    for vote in votes:
+        if vote.get("type") == "IGNORE":
+            continue
+        key = tuple(vote.get(column) for column in VOTE_KEY)
+        if key in merged:
+            duplicates.append(vote)
+        else:
+            merged[key] = vote
+    if not index or not merged:
+        return [], duplicates
+
+    for key, voting in index.items():
+        row = merged.setdefault(key, {})
+        for column, value in voting.items():
+            if column in columns and column not in VOTE_KEY:
+                column += "_rcv"
+            row[column] = value
+    for row in merged.values():
+        row.pop("sess_date", None)
+        row["date"] = row.pop("date_rcv", None) or row.get("date")
+    return [
+        merged[key]
+        for key in sorted(
+            merged, key=lambda key: [(value is None, value) for value in key]
+        )
+    ], duplicates
+
+
+def prefetch_days(vote_dates):
+    """Documents of plenary days, as fetch_plenary_day returns them, in order.
+
+    They are fetched ahead in a thread pool while the consumer parses them.
+    """
+    return prefetch(
+        lambda vote_date: fetch_plenary_day(cached_session(), vote_date), vote_dates
+    )
+
+
+def parse_session(sess, mepmap, mep_ids, columns=None, fetched=None):
+    """Parse the VOT, RCV and PV documents of a plenary session.
+
+    Records are returned per day without deduplication, each VOT vote and
+    RCV voting with its dedup key (None for VOT votes never deduplicated),
+    and the record itself or None when only its key matters.
+    `returns` holds the result of the first "renvoi en commission" found in
+    the PV for each document voted on so far in the session, None when the
+    day has no RCV. Positions are kept for the members of `mep_ids`, compact
+    with `columns`. The documents of the days are taken from `fetched` when
+    given, which may go on with those of the next sessions.
+    """
+    sess_date, vote_dates = sess
+    days = []
+    sess_docs = {}
+    if fetched is None:
+        fetched = prefetch_days(vote_dates)
+    for vote_date, (vot, rcv_xml, pv_html) in zip(vote_dates, fetched):
+        print(vote_date)
+        day = dict(date=vote_date, votes=[], votings=[], returns=None)
+        days.append(day)
+        url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}-VOT_FR.xml"
+        if vot is None:
+            continue
+        start = time.perf_counter()
+        xml = ET.fromstring(vot)
+
+        if vote_date < date(2024, 1, 16):
+            for vote in xml[0].find("Vote.Results"):
+                doc = rows = None
+                title = vote.find("Vote.Result.Text.Title").text
+                description = vote.find("Vote.Result.Description.Text")
+                table = vote.find("Vote.Result.Table.Results/TABLE")
+                if description is not None and table is not None:
+                    desc = "".join(description.itertext())
+                    doc = extract_doc(desc)
+                    rows = process_table(table)
+                else:
+                    continue
+                for row in rows:
+                    subject = row["Objet"] or ""
+                    doc = extract_doc(subject) or doc
+                    result = parse_result(row["Vote"])
+                    rcv = row["AN, etc."]
+                    record = None
+                    if doc and result is not None and rcv != "div":
+                        amendment = row.get("Am n°")
+                        subject, amendment, type = parse_subject(subject, amendment)
+                        remarks = row.get("Votes par AN/VE - observations")
+                        try:
+                            splits = re.findall(r"\d+", remarks)
+                            votes = list(map(int, splits[:3]))
+                        except:
+                            votes = None
+                        author = row.get("Auteur")
+                        if not (
+                            doc == "A9-0337/2023" and subject == "Article 16, § 3 TUE"
+                        ):
+                            record = dict(
+                                doc=doc,
+                                sess_date=sess_date,
+                                date=vote_date,
+                                subject=subject,
+                                author=(
+                                    json.dumps(parse_author(author)) if author else None
+                                ),
+                                type=type,
+                                rcv=rcv is not None and "AN" in rcv,
+                                split=extract_split(row["AN, etc."]),
+                                amendment=amendment,
+                                result=result,
+                                votes=json.dumps(votes) if votes else None,
+                                # remarks=remarks,
+                                url=url,
+                            )
+                    key = vot_dedup_key(record) if record else None
+                    day["votes"].append((key, record))
+
+                table = vote.find("Vote.Result.Table.Requests/TABLE")
+                if table is not None:
+                    rows = process_table(table, header=False)
+                    div = None
+                    amd = None
+                    split = None
+                    for row in rows:
+                        if div:
+                            if amd:
+                                try:
+                                    split = int(re.search(r"(\d+).*partie", row[0])[1])
+                                except:
+                                    pass
+                            else:
+                                try:
+                                    amd = int(
+                                        re.search(r"amendement\s+(\d+)", row[0])[1]
+                                    )
+                                except:
+                                    pass
+                        else:
+                            div = "division" in row[0].lower()
+
+        else:  # New XML format on PE website
+            for vote in xml.find(".//votes").findall("vote"):
+                desc = vote.find("label").text or ""
+                doc = extract_doc(desc)
+                for voting in vote.findall(".//voting"):
+                    subject = (
+                        (voting.find("title").text or "")
+                        + (voting.find("label").text or "")
+                        + (voting.find("amendmentSubject").text or "")
+                    )
+                    doc = extract_doc(subject) or doc
+                    rcv = getattr(voting.find("rcv/value"), "text", None)
+                    split = extract_split(rcv or "")
+                    result = parse_result(voting.get("result"))
+                    if doc and result is not None:
+                        amendment = voting.find("amendmentNumber").text
+                        subject, amendment, type = parse_subject(
+                            subject or "", amendment
+                        )
+                        votes = voting.find("observations").text
+                        author = voting.find("amendmentAuthor").text
+                        # Votes of the new format are not deduplicated.
+                        day["votes"].append(
+                            (
+                                None,
+                                dict(
+                                    sess_date=sess_date,
+                                    date=vote_date,
+                                    doc=doc,
+                                    subject=subject,
+                                    author=(
+                                        json.dumps(parse_author(author))
+                                        if author
+                                        else None
+                                    ),
+                                    type=type,
+                                    split=split,
+                                    amendment=amendment,
+                                    rcv=rcv is not None and "AN" in rcv,
+                                    result=result,
+                                    votes=(
+                                        json.dumps(list(map(int, votes.split(", "))))
+                                        if votes
+                                        else None
+                                    ),
+                                    url=url,
+                                ),
+                            )
+                        )
+        sess_docs.update((vote["doc"], None) for _, vote in day["votes"] if vote)
+        add_time("vot", start)
+
+        url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}-RCV_FR.xml"
+        if rcv_xml is None:
+            continue
+        start = time.perf_counter()
+        xml = ET.fromstring(rcv_xml)
+        for entry in xml.findall("RollCallVote.Result"):
+            title = re.sub(
+                r"\s+",
+                " ",
+                "".join(entry.find("RollCallVote.Description.Text").itertext()),
+            )
+            try:
+                doc = extract_doc(title)
+            except:
+                continue
+            match = re.search(r"am\s+(.*)", title.lower())
+            ref = extract_ref(title)
+            if match:
+                splits = match[1].split("/")
+
+                amendment = splits[0]
+
+                try:
+                    split = splits[1]
+                except:
+                    split = None
+            else:
+                amendment, split = None, None
+            subject, amendment, type = parse_subject(title, amendment)
+            id = entry.get("Identifier")
+            vote = None
+            if doc:
+                vote = dict(
+                    id=id,
+                    sess_date=sess_date,
+                    date=vote_date,
+                    subject=title,
+                    type=type,
+                    amendment=amendment,
+                    split=split,
+                    doc=doc,
+                    ref=ref,
+                    url=url.replace(".xml", ".html"),
+                )
+                positions = {}
+                votes = []
+                # Positions of the whole groups, not only of `mep_ids`
+                group_votes = {}
+                for i, position in enumerate(["For", "Against", "Abstention"]):
+                    groups = entry.find(f"Result.{position}")
+                    votes.append(int(groups.get("Number")) if groups is not None else 0)
+                    if groups is not None:
+                        for group in groups:
+                            group_id = parse_group(group.get("Identifier"))
+                            group_votes.setdefault(group_id, [0, 0, 0])[i] += len(group)
+                            for rcv in group:
+                                member_id = rcv.get(
+                                    "PersId", mepmap.get(rcv.text, None)
+                                )
+                                if member_id and int(member_id) in mep_ids:
+                                    positions[member_id] = position.upper()
+                vote["positions"] = (
+                    encode_positions(positions, columns)
+                    if columns
+                    else json.dumps(positions)
+                )
+                vote["votes"] = json.dumps(votes) if len(votes) else None
+                vote["group_votes"] = json.dumps(group_votes)
+                sess_docs[doc] = None
+            day["votings"].append((id, vote))
+        add_time("rcv", start)
+
+        day["url"] = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}_FR.html"
+        start = time.perf_counter()
+        day["returns"] = pv_returns(parse_html(pv_html), sess_docs)
+        add_time("pv", start)
+    return days
+
+
+def pv_returns(pv, docs):
+    """Result of the first "renvoi en commission" after each of `docs` in a PV.
+
+    Only the paragraphs following the one holding the document reference are
+    looked at.
+    """
+    returns = {}
+    for doc in docs:
+        for paragraph in pv.xpath("//text()[. = $doc]/ancestor::p[1]", doc=doc):
+            lines = [p.text_content().lower() for p in paragraph.itersiblings("p")]
+            for i, line in enumerate(lines):
+                if "renvoi en commission" in line:
+                    returns.setdefault(
+                        doc,
+                        (
+                            "ADOPTED"
+                            if "approuvé" in "".join(lines[i + 1 : i + 2])
+                            else "REJECTED"
+                        ),
+                    )
+    return returns
+
+
+def collect_session(sess_date, days, processed):
+    """Votes and votings of a parsed session not seen before, in parsing order.
+
+    `processed` holds the dedup keys of earlier sessions and is updated. A
+    RETURN vote is added for documents sent back to committee in the PV.
+    """
+    sess_votes = []
+    sess_votings = []
+    for day in days:
+        for key, vote in day["votes"]:
+            if key is not None:
+                if key in processed:
+                    continue
+                processed.add(key)
+            if vote:
+                sess_votes.append(vote)
+        for id, voting in day["votings"]:
+            if id in processed:
+                continue
+            processed.add(id)
+            if voting:
+                sess_votings.append(voting)
+        if day["returns"] is None:
+            continue
+        votes = sess_votes + sess_votings
+        returned = {vote["doc"] for vote in votes if vote["type"] == "RETURN"}
+        for doc in dict.fromkeys(vote["doc"] for vote in votes):
+            if doc in day["returns"] and doc not in returned:
+                sess_votes.append(
+                    dict(
+                        doc=doc,
+                        type="RETURN",
+                        url=day["url"],
+                        date=day["date"],
+                        sess_date=sess_date,
+                        result=day["returns"][doc],
+                    )
+                )
+    return sess_votes, sess_votings
+
+
+def term_dir(term):
+    """Directory of the outputs of `term`, `_data` for the current term."""
+    return Path("_data") if term == CURRENT_TERM else TERMS_DIR / str(term)
+
+
+def use_term(term, data_dir=None):
+    """Import `term` into `data_dir`, `term_dir(term)` by default."""
+    global TERM, DATA_DIR
+    TERM = term
+    DATA_DIR = data_dir or term_dir(term)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def init_worker(term, data_dir, processes):
+    """Set up a worker process importing `term` along with `processes` others."""
+    use_term(term, data_dir)
+    share_host_limits(processes)
+
+
+def run_term(term, data, db=None, **options):
+    """Run a stage on the partition of `term`, once and for all if it is finished.
+
+    Stages completed on a past term are recorded in its `finished.json` and
+    skipped afterwards.
+    """
+    use_term(term)
+    finished_file = DATA_DIR / "finished.json"
+    finished = json.loads(finished_file.read_text()) if finished_file.exists() else {}
+    if data in finished:
+        print(f"Term {term} is finished, {data} was imported on {finished[data]}")
+        return
+    if db:
+        db = db.with_stem(f"{db.stem}-{term}")
+    run(data, db=db, **options)
+    if term < CURRENT_TERM:
+        finished[data] = dt.now().isoformat(timespec="seconds")
+        finished_file.write_text(json.dumps(finished, indent=2))
+
+
+def main(
+    data: Data,
+    action: Optional[CacheAction] = typer.Argument(None),
+    incremental: bool = False,
+    db: Optional[Path] = None,
+    compact_positions: bool = False,
+    jobs: int = 1,
+    term: Optional[List[int]] = typer.Option(None),
+    record: Optional[Path] = None,
+    replay: Optional[Path] = None,
+    profile: Optional[Path] = None,
+    profile_dump: bool = False,
+):
+    if record:
+        os.environ[RECORD_ENV] = str(record.resolve())
+    if replay:
+        os.environ[REPLAY_ENV] = str(replay.resolve())
+    options = dict(
+        action=action,
+        incremental=incremental,
+        db=db,
+        compact_positions=compact_positions,
+        jobs=jobs,
+    )
+    if term and data in MEMBERS_STAGES:
+        missing = [t for t in term if not (term_dir(t) / "members.csv").exists()]
+        if missing:
+            raise typer.BadParameter(
+                "import the members of these terms first with: python imports.py"
+                " members " + " ".join(f"--term {t}" for t in missing),
+                param_hint="--term",
+            )
+    profiling = nullcontext()
+    if profile:
+        profiling = profiled_run(profile, data, term, profile_dump)
+    with profiling:
+        if not term or data == Data.CACHE:
+            run(data, **options)
+        elif len(term) == 1:
+            run_term(term[0], data, **options)
+        else:
+            # Terms are imported concurrently, each in its own process since
+            # the term is a global of the module, sharing the host limits.
+            import multiprocessing
+
+            with ProcessPoolExecutor(
+                len(term),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=share_host_limits,
+                initargs=(len(term),),
+            ) as pool:
+                futures = [pool.submit(run_term, t, data, **options) for t in term]
+                for future in futures:
+                    future.result()
+
+
+def run(data, action=None, incremental=False, db=None, compact_positions=False, jobs=1):
+    global DB
+    if db:
+        DB = open_db(db)
+
     match data:
+        case Data.CACHE:
+            match action:
+                case CacheAction.PRUNE:
+                    evicted = prune_cache(cached_session())
+                    cached_session().cache.responses.vacuum()
+                    print(f"Evicted {evicted} responses")
+                case _:
+                    stats = cache_stats(cached_session())
+                    for host, (number, size) in sorted(stats["hosts"].items()):
+                        print(f"{host}: {number} responses, {size / 1e6:.1f} MB")
+                    print(
+                        f"{stats['responses']} responses ({stats['expired']} expired),"
+                        f" {stats['size'] / 1e6:.1f} MB compressed,"
+                        f" {stats['file_size'] / 1e6:.1f} MB on disk"
+                    )
+
         case Data.MEMBERS:
             members = []
-            for mep in read_json("ep_meps.json"):
+            for mep in read_json("ep_meps.json", lambda line: b'"France"' in line):
                 if "Constituencies" in mep:
                     constituencies = list(
                         c
@@ -558,37 +2432,43 @@ def main(data: Data):
                                 groups=json.dumps(mep["Groups"]),
                             )
                         )
-            with open("_data/members.csv", "w") as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=members[0].keys())
+            with open_table("members", list(members[0].keys())) as writer:
                 writer.writeheader()
                 writer.writerows(members)
 
         case Data.DOCS:
-            from tqdm.contrib.concurrent import process_map
+            import multiprocessing
+            from tqdm.contrib.concurrent import thread_map
 
-            with open("_data/votes.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                docs = {}
-                for vote in reader:
-                    doc = vote["doc"]
-                    ref = vote["ref"]
-                    docs[doc] = ref or docs.get(doc, None)
+            docs = {}
+            for vote in read_rows("votes", "doc", "ref"):
+                doc = vote["doc"]
+                ref = vote["ref"]
+                docs[doc] = ref or docs.get(doc, None)
 
             with (
-                open("_data/docs.csv", "w") as docfile,
-                open("_data/amendments.csv", "w") as amdfile,
+                open_table("docs", ["ref", "procedure", "url"]) as docwriter,
+                open_table(
+                    "amendments",
+                    ["doc", "nr", "old", "new", "diff", "authors", "url"],
+                ) as amdwriter,
+                diff_cache() as diff,
             ):
-                docwriter = csv.DictWriter(
-                    docfile, fieldnames=["ref", "procedure", "url"]
-                )
                 docwriter.writeheader()
-
-                amdwriter = csv.DictWriter(
-                    amdfile, fieldnames=["doc", "nr", "old", "new", "authors", "url"]
-                )
                 amdwriter.writeheader()
 
-                for result in process_map(fetch_doc, docs.keys()):
+                # Fetching is I/O bound, the PDF tables are extracted on a
+                # process pool shared by all documents.
+                pool = ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+                with pool:
+                    results = thread_map(
+                        partial(fetch_doc, pool=pool),
+                        docs.keys(),
+                        max_workers=FETCH_WORKERS,
+                    )
+                for result in results:
                     amendments = []
                     try:
                         doc, amendments = result
@@ -597,184 +2477,376 @@ def main(data: Data):
                     docwriter.writerow(doc)
                     for amd in amendments:
                         amd["doc"] = doc["ref"]
+                        # Rendered by the amendment macro instead of diffing
+                        # on every build of the site.
+                        amd["diff"] = json.dumps(diff(amd["old"], amd["new"]))
                         amdwriter.writerow(amd)
 
         case Data.ACTIVITIES:
-            with open("_data/members.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                mep_ids = [int(mep["id"]) for mep in reader]
-
-            session = CachedSession()
-
-            activities = []
-            all_speeches = []
-            explanations = []
-            for activity in read_json("ep_mep_activities.json"):
-                if activity["mep_id"] in mep_ids:
-                    speeches = []
-                    if "CRE" in activity:
-                        for speech in activity["CRE"]:
-                            if speech["term"] == TERM:
-                                xml = ET.fromstring(
-                                    session.get(
-                                        speech["url"].replace(".html", ".xml")
-                                    ).text.replace("&nbsp;", " ")
-                                )
-                                content = [
-                                    para.text
-                                    for para in xml.findall(".//PARA")
-                                    if para.text
-                                ]
-                                speeches.append(
-                                    dict(
-                                        member_id=activity["mep_id"],
-                                        title=speech["title"],
-                                        date=speech["date"],
-                                        procedure=(
-                                            speech["dossiers"][0]
-                                            if "dossiers" in speech
-                                            else None
-                                        ),
-                                        content=json.dumps(content),
+            mep_ids = [int(mep["id"]) for mep in read_rows("members", "id")]
+
+            session = cached_session()
+            # Speeches are fetched in the background while the dump is read,
+            # the fetches left are cancelled if reading it fails.
+            executor = ThreadPoolExecutor(FETCH_WORKERS)
+            try:
+                activities = []
+                all_speeches = []
+                explanations = []
+                for activity in read_json(
+                    "ep_mep_activities.json", key_filter("mep_id", mep_ids)
+                ):
+                    if activity["mep_id"] in mep_ids:
+                        speeches = []
+                        if "CRE" in activity:
+                            for speech in activity["CRE"]:
+                                if speech["term"] == TERM:
+                                    content = executor.submit(
+                                        fetch_speech,
+                                        session,
+                                        speech["url"].replace(".html", ".xml"),
                                     )
-                                )
-                    all_speeches.extend(speeches)
-
-                    if "WEXP" in activity:
-                        for exp in activity["WEXP"]:
-                            doc = extract_doc(exp["title"])
-                            if doc and exp["term"] == TERM:
-                                explanations.append(
-                                    dict(
-                                        member_id=activity["mep_id"],
-                                        date=speech["date"],
-                                        doc=doc,
-                                        content=exp["text"],
+                                    speeches.append(
+                                        dict(
+                                            member_id=activity["mep_id"],
+                                            title=speech["title"],
+                                            date=speech["date"],
+                                            procedure=(
+                                                speech["dossiers"][0]
+                                                if "dossiers" in speech
+                                                else None
+                                            ),
+                                            content=content,
+                                        )
+                                    )
+                        all_speeches.extend(speeches)
+
+                        if "WEXP" in activity:
+                            for exp in activity["WEXP"]:
+                                doc = extract_doc(exp["title"])
+                                if doc and exp["term"] == TERM:
+                                    explanations.append(
+                                        dict(
+                                            member_id=activity["mep_id"],
+                                            date=speech["date"],
+                                            doc=doc,
+                                            content=exp["text"],
+                                        )
                                     )
-                                )
 
-                    if "IMOTION" in activity:
-                        imotions = [
-                            imotion
-                            for imotion in activity["IMOTION"]
-                            if imotion["term"] == TERM
-                        ]
-                    else:
-                        imotions = None
-
-                    if "REPORT" in activity:
-                        reports = [
-                            report
-                            for report in activity["REPORT"]
-                            if report["term"] == TERM
-                        ]
-                    else:
-                        reports = None
-
-                    activities.append(
-                        dict(
-                            member_id=activity["mep_id"],
-                            imotions=len(imotions) if imotions else 0,
-                            reports=len(reports) if reports else 0,
-                            speeches=len(speeches) if speeches else 0,
+                        if "IMOTION" in activity:
+                            imotions = [
+                                imotion
+                                for imotion in activity["IMOTION"]
+                                if imotion["term"] == TERM
+                            ]
+                        else:
+                            imotions = None
+
+                        if "REPORT" in activity:
+                            reports = [
+                                report
+                                for report in activity["REPORT"]
+                                if report["term"] == TERM
+                            ]
+                        else:
+                            reports = None
+
+                        activities.append(
+                            dict(
+                                member_id=activity["mep_id"],
+                                imotions=len(imotions) if imotions else 0,
+                                reports=len(reports) if reports else 0,
+                                speeches=len(speeches) if speeches else 0,
+                            )
                         )
-                    )
 
-            dicts_to_csv(activities, "activities")
-            dicts_to_csv(explanations, "explanations")
-            dicts_to_csv(all_speeches, "speeches")
+                for speech in tqdm(all_speeches, desc="Fetching speeches"):
+                    speech["content"] = json.dumps(speech["content"].result())
+            finally:
+                executor.shutdown(cancel_futures=True)
+
+            dicts_to_csv(
+                activities,
+                "activities",
+                ["member_id", "imotions", "reports", "speeches"],
+            )
+            dicts_to_csv(
+                explanations, "explanations", ["member_id", "date", "doc", "content"]
+            )
+            dicts_to_csv(
+                all_speeches,
+                "speeches",
+                ["member_id", "title", "date", "procedure", "content"],
+            )
 
         case Data.ATTENDANCES:
-            with open("_data/members.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                meps = list(mep for mep in reader)
+            meps = list(read_rows("members", "id", "full_name", "last_name"))
 
-            session = CachedSession()
+            session = cached_session()
+            days = [
+                vote_date for _, vote_dates in get_dates() for vote_date in vote_dates
+            ]
             attendances = []
-            for sess_date in get_dates():
-                url = f"{EP_BASE_URL}PV-{TERM}-{sess_date.strftime("%Y-%m-%d")}-ATT_FR.html"
-                try:
-                    request = session.get(url)
-                    request.raise_for_status()
-                except requests.HTTPError:
-                    print(url)
+            bitsets = {mep["id"]: 0 for mep in meps}
+            dates = []
+            pages = prefetch(partial(fetch_attendance, session), days)
+            for vote_date, content in zip(days, pages):
+                if content is None:
                     continue
-                html = bs4.BeautifulSoup(request.content)
-
-                attended = []
-                for content in html.select("p.contents"):
-                    if ":" not in content.text:
-                        attended.extend(content.text.split(", "))
-
+                attended = attendees(content)
                 for mep in meps:
-                    if mep["full_name"].title() in attended:
-                        attend = True
-                    elif key := mep["last_name"].title() in attended:
-                        attend = True
-                    else:
-                        attend = False
-
+                    attend = (
+                        normalize(mep["full_name"]) in attended
+                        or normalize(mep["last_name"]) in attended
+                    )
+                    bitsets[mep["id"]] |= attend << len(dates)
                     attendances.append(
                         dict(
-                            date=sess_date,
+                            date=vote_date,
                             member_id=mep["id"],
                             attend=attend,
                         )
                     )
+                dates.append(vote_date.isoformat())
 
-            with open("_data/attendances.csv", "w") as csvfile:
+            with open(DATA_DIR / "attendances.csv", "w") as csvfile:
                 fieldnames = attendances[0].keys()
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(attendances)
+            count_rows("attendances", len(attendances))
+
+            # Bit i of a member's bitset is their attendance on dates[i], as
+            # hex digits holding 4 days each, least significant bit first.
+            nibbles = (len(dates) + 3) // 4
+            with open(DATA_DIR / "attendance_days.json", "w") as f:
+                json.dump(
+                    dict(
+                        dates=dates,
+                        members={
+                            member_id: "".join(
+                                f"{bitset >> (4 * k) & 0xF:x}" for k in range(nibbles)
+                            )
+                            for member_id, bitset in bitsets.items()
+                        },
+                    ),
+                    f,
+                    separators=(",", ":"),
+                )
 
         case Data.NEWS:
-            session = CachedSession()
-
-            news = []
-            page = 0
-            while True:
-                print(page)
-                url = f"https://www.europarl.europa.eu/news/fr/page/{page}?contentType=plenary"
-                page += 1
-                request = session.get(url)
-                html = bs4.BeautifulSoup(request.content, features="lxml")
-                links = html.find_all("a")
-                if links:
+            session = cached_session()
+            known = {}
+            seen = set()
+            seen_file = CACHE_DIR / f"news_seen_{TERM}.txt"
+            if incremental and (DATA_DIR / "news.csv").exists():
+                with open(DATA_DIR / "news.csv") as csvfile:
+                    reader = csv.DictReader(csvfile)
+                    known = {article["url"]: article for article in reader}
+                if seen_file.exists():
+                    seen.update(seen_file.read_text().split())
+                seen.update(known)
+
+            # Articles are fetched in the background while the listing is
+            # paged through, up to the first page without any new article.
+            articles = {}
+            with ThreadPoolExecutor(FETCH_WORKERS) as executor:
+                page = 0
+                while True:
+                    print(page)
+                    url = f"https://www.europarl.europa.eu/news/fr/page/{page}?contentType=plenary"
+                    page += 1
+                    request = session.get(url)
+                    html = bs4.BeautifulSoup(request.content, features="lxml")
+                    links = [
+                        a for a in html.find_all("a") if a.attrs["href"] not in seen
+                    ]
+                    if not links:
+                        break
                     for a in links:
                         url = a.attrs["href"]
-                        request = session.get(url)
-                        html = bs4.BeautifulSoup(request.content)
-                        title = a.select_one(".ep_name").text
-                        spans = html.find_all(string=re.compile("Fiche de procédure"))
-                        hrefs = [span.find_parent("a").attrs["href"] for span in spans]
-                        refs = [
-                            extract_ref(parse.unquote(href)) for href in hrefs if href
-                        ]
-                        facts = [
-                            e.get_text(strip=True)
-                            for e in html.select(".ep-a_facts .ep-p_text")
-                        ]
-                        if refs and facts:
-                            news.append(
-                                dict(
-                                    title=title,
-                                    refs=json.dumps(refs),
-                                    facts=json.dumps(facts),
-                                    url=url,
-                                )
+                        if url not in articles:
+                            title = a.select_one(".ep_name").text
+                            articles[url] = executor.submit(
+                                fetch_article, session, url, title
                             )
-                else:
-                    break
+                news = [
+                    article
+                    for future in articles.values()
+                    if (article := future.result())
+                ]
+
+            news.extend(
+                article for url, article in known.items() if url not in articles
+            )
+            seen_file.parent.mkdir(parents=True, exist_ok=True)
+            seen_file.write_text("\n".join(sorted(seen | articles.keys())))
 
-            with open("_data/news.csv", "w") as csvfile:
+            with open(DATA_DIR / "news.csv", "w") as csvfile:
                 fieldnames = news[0].keys()
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 writer.writeheader()
                 writer.writerows(news)
+            count_rows("news", len(news))
+
+        case Data.POSITIONS:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            votes, member_ids, matrix = load_positions()
+            column = lambda key: pa.array([vote[key] or None for vote in votes])
+            table = pa.table(
+                dict(
+                    id=column("id"),
+                    date=pa.array(
+                        [date.fromisoformat(vote["date"]) for vote in votes],
+                        pa.date32(),
+                    ),
+                    doc=column("doc").dictionary_encode(),
+                    type=column("type").dictionary_encode(),
+                    result=column("result").dictionary_encode(),
+                    positions=pa.FixedSizeListArray.from_arrays(
+                        pa.array(matrix.ravel()), len(member_ids)
+                    ),
+                ),
+                metadata=dict(
+                    member_ids=json.dumps(member_ids),
+                    position_codes=json.dumps(POSITION_CODES),
+                ),
+            )
+            pq.write_table(table, DATA_DIR / "positions.parquet")
+            count_rows("positions", len(votes))
+            print(f"Wrote {len(votes)} votes x {len(member_ids)} members")
+
+        case Data.STATS:
+            import numpy as np
+
+            votes, member_ids, matrix = load_positions()
+            if missing := sum(1 for vote in votes if not vote.get("group_votes")):
+                print(
+                    f"{missing} votes have no group counts, hence no group lines,"
+                    " import the votes again"
+                )
+            group_ids, membership, counts, lines = group_stats(
+                votes, member_ids, matrix
+            )
+            names = {code: name for name, code in POSITION_CODES.items()}
+
+            member_lines = np.take_along_axis(
+                lines, np.maximum(membership, 0).astype(np.intp), axis=1
+            )
+            member_lines[membership < 0] = 0
+            followed = (matrix > 0) & (member_lines > 0)
+            loyal = followed & (matrix == member_lines)
+            rebel = followed & ~loyal
+
+            dicts_to_csv(
+                [
+                    dict(
+                        vote_id=vote["id"],
+                        date=vote["date"],
+                        doc=vote["doc"],
+                        group=group_id,
+                        line=names.get(lines[i, g]),
+                        **{
+                            name.lower(): counts[i, g, code - 1]
+                            for name, code in POSITION_CODES.items()
+                        },
+                    )
+                    for i, vote in enumerate(votes)
+                    for g, group_id in enumerate(group_ids)
+                    if counts[i, g].any()
+                ],
+                "group_lines",
+                ["vote_id", "date", "doc", "group", "line"]
+                + [name.lower() for name in POSITION_CODES],
+            )
+            dicts_to_csv(
+                [
+                    dict(
+                        member_id=member_id,
+                        votes=followed[:, j].sum(),
+                        loyal=loyal[:, j].sum(),
+                        rate=(
+                            round(loyal[:, j].sum() / followed[:, j].sum(), 4)
+                            if followed[:, j].any()
+                            else None
+                        ),
+                    )
+                    for j, member_id in enumerate(member_ids)
+                ],
+                "loyalty",
+                ["member_id", "votes", "loyal", "rate"],
+            )
+            dicts_to_csv(
+                [
+                    dict(
+                        vote_id=votes[i]["id"],
+                        date=votes[i]["date"],
+                        doc=votes[i]["doc"],
+                        member_id=member_ids[j],
+                        group=group_ids[membership[i, j]],
+                        position=names[matrix[i, j]],
+                        line=names[member_lines[i, j]],
+                    )
+                    for i, j in zip(*np.nonzero(rebel))
+                ],
+                "rebellions",
+                ["vote_id", "date", "doc", "member_id", "group", "position", "line"],
+            )
+
+        case Data.INDEXES:
+            write_indexes()
+
+        case Data.SEARCH:
+            subjects = {}
+            if (DATA_DIR / "subjects.json").exists():
+                with open(DATA_DIR / "subjects.json") as f:
+                    subjects = {s["code"]: s["name"] for s in json.load(f)}
+            members = {
+                mep["id"]: mep["full_name"]
+                for mep in read_rows("members", "id", "full_name")
+            }
+            doc_procedures = {
+                doc["ref"]: doc["procedure"]
+                for doc in read_rows("docs", "ref", "procedure")
+            }
+
+            def documents():
+                for proc in read_rows("procedures", "reference", "title", "subjects"):
+                    codes = json.loads(proc["subjects"])
+                    names = [subjects.get(code, "") for code in codes]
+                    yield (
+                        " ".join([proc["title"], *names]),
+                        ["procedure", proc["title"], f"/procedure/{proc['reference']}"],
+                    )
+                with open(DATA_DIR / "speeches.csv") as csvfile:
+                    for speech in csv.DictReader(csvfile):
+                        url = (
+                            f"/procedure/{speech['procedure']}"
+                            if speech["procedure"]
+                            else f"/member/{speech['member_id']}"
+                        )
+                        member = members.get(speech["member_id"], "")
+                        yield (
+                            " ".join(json.loads(speech["content"])),
+                            ["speech", f"{member} : {speech['title']}", url],
+                        )
+                for amd in read_rows("amendments", "doc", "nr", "old", "new"):
+                    procedure = doc_procedures.get(amd["doc"])
+                    url = f"/procedure/{procedure}#{amd['nr']}" if procedure else None
+                    yield (
+                        f"{amd['old']} {amd['new']}",
+                        ["amendment", f"{amd['doc']} amendement n°{amd['nr']}", url],
+                    )
+
+            search_dir = SEARCH_DIR if TERM == CURRENT_TERM else DATA_DIR / SEARCH_DIR
+            entries, tokens, shards = write_search_index(documents(), search_dir)
+            print(f"Indexed {entries} documents, {tokens} tokens in {shards} shards")
 
         case Data.SUBJECTS:
-            sess = requests.Session()
+            sess = uncached_session()
             sess.get("https://oeil.secure.europarl.europa.eu/oeil/search/search.do")
             sess.cookies.update({"oeilLanguage": "fr"})
             html = sess.get(
@@ -785,15 +2857,15 @@ def main(data: Data):
             for a in soup.find_all("a"):
                 key, subject = str(a.attrs["title"]).split(" ", 1)
                 subject_tree.append({"code": key, "name": subject})
-            with open("_data/subjects.json", "w") as f:
+            with open(DATA_DIR / "subjects.json", "w") as f:
                 json.dump(subject_tree, f, indent=2)
 
         case Data.COUNTRIES:
-            with open("_data/procedures.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                codes = set(
-                    code for proc in reader for code in json.loads(proc["countries"])
-                )
+            codes = set(
+                code
+                for proc in read_rows("procedures", "countries")
+                for code in json.loads(proc["countries"])
+            )
 
             with open("iso-3166_country_french.json") as f:
                 iso_map = json.load(f)
@@ -837,39 +2909,107 @@ def main(data: Data):
                 except:
                     print("ERROR", code)
                 countries.append({"code": code, "flag": flag, "name": name})
-            with open("_data/countries.json", "w") as f:
+            with open(DATA_DIR / "countries.json", "w") as f:
                 json.dump(countries, f, indent=2, ensure_ascii=False)
 
         case Data.PROCEDURES:
-            with open("_data/docs.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                refs = set(doc["procedure"] for doc in reader)
+            refs = set(doc["procedure"] for doc in read_rows("docs", "procedure"))
 
             from tqdm.contrib.concurrent import process_map
 
-            procs = process_map(fetch_proc, refs)
+            # Each worker process has its own limiter, so bound the number of
+            # workers by the host concurrency instead.
+            procs = process_map(
+                fetch_proc,
+                refs,
+                max_workers=HOST_LIMITS["oeil.secure.europarl.europa.eu"][0],
+            )
             procs = list(filter(bool, procs))
 
-            with open("_data/procedures.csv", "w") as csvfile:
-                fieldnames = procs[0].keys()
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            with open_table("procedures", list(procs[0].keys())) as writer:
                 writer.writeheader()
                 writer.writerows(filter(None, procs))
 
         case Data.VOTES:
             processed = set()
-            session = CachedSession()
-
-            with open("_data/members.csv") as csvfile:
-                reader = csv.DictReader(csvfile)
-                mepmap = {
-                    mep["last_name"].capitalize(): int(mep["id"]) for mep in reader
-                }
-
-            with open("_data/votes.csv", "w") as csvfile:
-                writer = csv.DictWriter(
-                    csvfile,
-                    fieldnames=[
+
+            mepmap = {
+                mep["last_name"].capitalize(): int(mep["id"])
+                for mep in read_rows("members", "id", "last_name")
+            }
+            mep_ids = frozenset(mepmap.values())
+            if compact_positions:
+                # New members go last so that positions already written keep
+                # their meaning.
+                position_members = read_position_members()
+                position_members += sorted(mep_ids.difference(position_members))
+                with open(DATA_DIR / POSITION_MEMBERS_FILE, "w") as f:
+                    json.dump(position_members, f)
+                columns = {member_id: i for i, member_id in enumerate(position_members)}
+
+            sessions = get_dates()
+            duplicates_file = DATA_DIR / VOTES_DUPLICATES_FILE
+            duplicates_file.unlink(missing_ok=True)
+            kept = []
+            if incremental:
+                try:
+                    latest = last_value("votes", "date")
+                except FileNotFoundError:
+                    latest = None
+                if latest:
+                    # The session holding the latest known day may still be
+                    # running, so it is processed again along with later ones.
+                    resume = max(
+                        (
+                            sess_date
+                            for sess_date, _ in sessions
+                            if sess_date.isoformat() <= latest
+                        ),
+                        default=date.min,
+                    )
+                    kept = list(
+                        read_rows("votes", where=[("date", operator.lt, resume)])
+                    )
+                    processed.update(row["id"] for row in kept if row["id"])
+                    processed.update(vot_dedup_key(row) for row in kept)
+                    sessions = [sess for sess in sessions if sess[0] >= resume]
+                    print(
+                        f"Resuming from session of {resume}, keeping {len(kept)} votes"
+                    )
+
+            # Sessions are parsed ahead of the deduplication, which must follow
+            # their order, in worker processes with --jobs.
+            parse = partial(
+                parse_session,
+                mepmap=mepmap,
+                mep_ids=mep_ids,
+                columns=columns if compact_positions else None,
+            )
+            if jobs > 1:
+                import multiprocessing
+
+                # The workers fetch the documents of their sessions, within
+                # their share of the host limits of this process.
+                pool = ProcessPoolExecutor(
+                    jobs,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(TERM, DATA_DIR, HOST_SHARE * jobs),
+                )
+                parsed = pool.map(parse, sessions)
+            else:
+                # A single thread parses the sessions in order, so the days of
+                # all of them are fetched ahead, across sessions.
+                fetched = prefetch_days(
+                    vote_date for _, vote_dates in sessions for vote_date in vote_dates
+                )
+                pool = nullcontext()
+                parsed = prefetch(partial(parse, fetched=fetched), sessions, workers=1)
+
+            with pool:
+                with open_table(
+                    "votes",
+                    [
                         "id",
                         "date",
                         "doc",
@@ -884,335 +3024,34 @@ def main(data: Data):
                         "result",
                         "votes",
                         "positions",
+                        "group_votes",
                         "url",
                         "url_rcv",
                     ],
-                )
-                writer.writeheader()
-                for sess_date, vote_dates in get_dates():
-                    sess_votes = []
-                    sess_votings = []
-                    for vote_date in vote_dates:
-                        print(vote_date)
-                        url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}-VOT_FR.xml"
-                        request = session.get(url)
-                        try:
-                            request.raise_for_status()
-                        except requests.HTTPError:
-                            continue
-                        xml = ET.fromstring(request.content)
-
-                        if vote_date < date(2024, 1, 16):
-                            for vote in xml[0].find("Vote.Results"):
-                                doc = rows = None
-                                title = vote.find("Vote.Result.Text.Title").text
-                                description = vote.find("Vote.Result.Description.Text")
-                                table = vote.find("Vote.Result.Table.Results/TABLE")
-                                if description is not None and table is not None:
-                                    desc = "".join(description.itertext())
-                                    doc = extract_doc(desc)
-                                    rows = process_table(table)
-                                else:
-                                    continue
-                                for row in rows:
-                                    subject = row["Objet"] or ""
-                                    doc = extract_doc(subject) or doc
-                                    result = parse_result(row["Vote"])
-                                    rcv = row["AN, etc."]
-                                    key = (doc, *row.values())
-                                    if key in processed:
-                                        continue
-                                    else:
-                                        processed.add(key)
-                                    if doc and result is not None and rcv != "div":
-                                        amendment = row.get("Am n°")
-                                        subject, amendment, type = parse_subject(
-                                            subject, amendment
-                                        )
-                                        remarks = row.get(
-                                            "Votes par AN/VE - observations"
-                                        )
-                                        try:
-                                            splits = re.findall(r"\d+", remarks)
-                                            votes = list(map(int, splits[:3]))
-                                        except:
-                                            votes = None
-                                        author = row.get("Auteur")
-                                        if (
-                                            doc == "A9-0337/2023"
-                                            and subject == "Article 16, § 3 TUE"
-                                        ):
-                                            continue
-                                        sess_votes.append(
-                                            dict(
-                                                doc=doc,
-                                                sess_date=sess_date,
-                                                date=vote_date,
-                                                subject=subject,
-                                                author=(
-                                                    json.dumps(parse_author(author))
-                                                    if author
-                                                    else None
-                                                ),
-                                                type=type,
-                                                rcv=rcv is not None and "AN" in rcv,
-                                                split=extract_split(row["AN, etc."]),
-                                                amendment=amendment,
-                                                result=result,
-                                                votes=(
-                                                    json.dumps(votes) if votes else None
-                                                ),
-                                                # remarks=remarks,
-                                                url=url,
-                                            )
-                                        )
-
-                                table = vote.find("Vote.Result.Table.Requests/TABLE")
-                                if table is not None:
-                                    rows = process_table(table, header=False)
-                                    div = None
-                                    amd = None
-                                    split = None
-                                    for row in rows:
-                                        if div:
-                                            if amd:
-                                                try:
-                                                    split = int(
-                                                        re.search(
-                                                            r"(\d+).*partie", row[0]
-                                                        )[1]
-                                                    )
-                                                except:
-                                                    pass
-                                            else:
-                                                try:
-                                                    amd = int(
-                                                        re.search(
-                                                            r"amendement\s+(\d+)",
-                                                            row[0],
-                                                        )[1]
-                                                    )
-                                                except:
-                                                    pass
-                                        else:
-                                            div = "division" in row[0].lower()
-
-                        else:  # New XML format on PE website
-                            for vote in xml.find(".//votes").findall("vote"):
-                                desc = vote.find("label").text or ""
-                                doc = extract_doc(desc)
-                                for voting in vote.findall(".//voting"):
-                                    subject = (
-                                        (voting.find("title").text or "")
-                                        + (voting.find("label").text or "")
-                                        + (voting.find("amendmentSubject").text or "")
-                                    )
-                                    doc = extract_doc(subject) or doc
-                                    rcv = getattr(
-                                        voting.find("rcv/value"), "text", None
-                                    )
-                                    split = extract_split(rcv or "")
-                                    result = parse_result(voting.get("result"))
-                                    if doc and result is not None:
-                                        amendment = voting.find("amendmentNumber").text
-                                        subject, amendment, type = parse_subject(
-                                            subject or "", amendment
-                                        )
-                                        votes = voting.find("observations").text
-                                        author = voting.find("amendmentAuthor").text
-                                        sess_votes.append(
-                                            dict(
-                                                sess_date=sess_date,
-                                                date=vote_date,
-                                                doc=doc,
-                                                subject=subject,
-                                                author=(
-                                                    json.dumps(parse_author(author))
-                                                    if author
-                                                    else None
-                                                ),
-                                                type=type,
-                                                split=split,
-                                                amendment=amendment,
-                                                rcv=rcv is not None and "AN" in rcv,
-                                                result=result,
-                                                votes=(
-                                                    json.dumps(
-                                                        list(
-                                                            map(int, votes.split(", "))
-                                                        )
-                                                    )
-                                                    if votes
-                                                    else None
-                                                ),
-                                                url=url,
-                                            )
-                                        )
-
-                        url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}-RCV_FR.xml"
-                        request = session.get(url)
-                        try:
-                            request.raise_for_status()
-                        except requests.HTTPError:
-                            continue
-                        xml = ET.fromstring(request.content)
-                        for entry in xml.findall("RollCallVote.Result"):
-                            title = re.sub(
-                                r"\s+",
-                                " ",
-                                "".join(
-                                    entry.find(
-                                        "RollCallVote.Description.Text"
-                                    ).itertext()
-                                ),
-                            )
-                            try:
-                                doc = extract_doc(title)
-                            except:
-                                continue
-                            match = re.search(r"am\s+(.*)", title.lower())
-                            ref = extract_ref(title)
-                            if match:
-                                splits = match[1].split("/")
-
-                                amendment = splits[0]
-
-                                try:
-                                    split = splits[1]
-                                except:
-                                    split = None
-                            else:
-                                amendment, split = None, None
-                            subject, amendment, type = parse_subject(title, amendment)
-                            id = entry.get("Identifier")
-                            if id in processed:
-                                continue
-                            else:
-                                processed.add(id)
-                            if doc:
-                                vote = dict(
-                                    id=id,
-                                    sess_date=sess_date,
-                                    date=vote_date,
-                                    subject=title,
-                                    type=type,
-                                    amendment=amendment,
-                                    split=split,
-                                    doc=doc,
-                                    ref=ref,
-                                    url=url.replace(".xml", ".html"),
-                                )
-                                positions = {}
-                                votes = []
-                                for position in ["For", "Against", "Abstention"]:
-                                    groups = entry.find(f"Result.{position}")
-                                    votes.append(
-                                        int(groups.get("Number"))
-                                        if groups is not None
-                                        else 0
-                                    )
-                                    if groups is not None:
-                                        for group in groups:
-                                            for rcv in group:
-                                                member_id = rcv.get(
-                                                    "PersId", mepmap.get(rcv.text, None)
-                                                )
-                                                if (
-                                                    member_id
-                                                    and int(member_id)
-                                                    in mepmap.values()
-                                                ):
-                                                    positions[member_id] = (
-                                                        position.upper()
-                                                    )
-                                vote["positions"] = json.dumps(positions)
-                                vote["votes"] = (
-                                    json.dumps(votes) if len(votes) else None
-                                )
-                                sess_votings.append(vote)
-
-                        url = f"{EP_BASE_URL}PV-{TERM}-{vote_date.strftime("%Y-%m-%d")}_FR.html"
-                        pv = bs4.BeautifulSoup(
-                            session.get(url).content, features="lxml"
+                ) as writer:
+                    writer.writeheader()
+                    writer.writerows(kept)
+                    for (sess_date, _), days in zip(sessions, parsed):
+                        sess_votes, sess_votings = collect_session(
+                            sess_date, days, processed
                         )
-                        for doc in set(
-                            vote["doc"] for vote in sess_votes + sess_votings
-                        ):
-                            matches = pv.findAll(string=doc)
-                            for match in matches:
-                                try:
-                                    lines = [
-                                        p.text.lower()
-                                        for p in match.find_parent(
-                                            "p"
-                                        ).find_next_siblings("p")
-                                    ]
-                                except:
-                                    continue
-                                for i, line in enumerate(lines):
-                                    if "renvoi en commission" in line and not any(
-                                        vote["doc"] == doc and vote["type"] == "RETURN"
-                                        for vote in sess_votes + sess_votings
-                                    ):
-                                        result = (
-                                            "ADOPTED"
-                                            if "approuvé" in lines[i + 1]
-                                            else "REJECTED"
-                                        )
-                                        sess_votes.append(
-                                            dict(
-                                                doc=doc,
-                                                type="RETURN",
-                                                url=url,
-                                                date=vote_date,
-                                                sess_date=sess_date,
-                                                result=result,
-                                            )
-                                        )
+                        merged, duplicates = merge_votes(sess_votes, sess_votings)
+                        if duplicates:
+                            print(
+                                f"{len(duplicates)} duplicate votes in session of"
+                                f" {sess_date}, see {duplicates_file}"
+                            )
+                            with open(duplicates_file, "a") as f:
+                                for vote in duplicates:
+                                    f.write(json.dumps(vote, default=str) + "\n")
+                        writer.writerows(merged)
 
-                    import pandas as pd
-
-                    votes_df = pd.DataFrame(sess_votes)
-                    votings_df = pd.DataFrame(sess_votings)
-                    if not votes_df.empty and not votings_df.empty:
-                        votes_df = votes_df.query('type != "IGNORE"')
-                        votings_df = votings_df.query('type != "IGNORE"')
-                        if not votes_df.empty and not votings_df.empty:
-                            on = [
-                                "sess_date",
-                                "doc",
-                                "amendment",
-                                "split",
-                                "type",
-                                "votes",
-                            ]
-                            try:
-                                merged = votes_df.merge(
-                                    votings_df,
-                                    on=on,
-                                    how="outer",
-                                    suffixes=(None, "_rcv"),
-                                    validate="1:1",
-                                )
-                            except pd.errors.MergeError:
-                                print(
-                                    votes_df[
-                                        votes_df.duplicated(on, keep=False)
-                                    ].values.tolist()
-                                )
-                                print(
-                                    votings_df[
-                                        votings_df.duplicated(on, keep=False)
-                                    ].values.tolist()
-                                )
-                                exit()
+    if data in (Data.DOCS, Data.VOTES, Data.NEWS):
+        # The indexes hold row numbers of their outputs.
+        write_indexes()
 
-                            merged = merged.replace(pd.NaT, None)
-                            merged["date"] = merged.apply(
-                                lambda row: row["date_rcv"] or row["date"], axis=1
-                            )
-                            merged = merged.drop(columns=["sess_date", "date_rcv"])
-                            writer.writerows(merged.to_dict("records"))
+    if http_session and cache_size(http_session) > CACHE_MAX_SIZE:
+        prune_cache(http_session)
 
 
 if __name__ == "__main__":
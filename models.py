@@ -1,11 +1,9 @@
 from enum import Enum, StrEnum, auto
 from typing import Optional
-from datetime import date
+import datetime
 
-import json
-from sqlalchemy import Enum as SAEnum, ForeignKey, JSON
+from sqlalchemy import Enum as SAEnum, ForeignKey
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy.types import JSON
 
 
 class Base(DeclarativeBase):
@@ -14,120 +12,80 @@ class Base(DeclarativeBase):
     }
 
 
-class Group(Enum):
-    PPE = "Groupe du Parti populaire européen (Démocrates-Chrétiens)"
-    RE = "Groupe Renew Europe"
-    GUE = "Le groupe de la gauche au Parlement européen - GUE/NGL"
-    ID = "Groupe «Identité et démocratie»"
-    VALE = "Groupe des Verts/Alliance libre européenne"
-    SD = "Groupe de l'Alliance Progressiste des Socialistes et Démocrates au Parlement européen"
-    ECR = "Groupe des Conservateurs et Réformistes européens"
-    NA = "Non-inscrits"
-
-    @classmethod
-    def from_str(cls, s):
-        match s:
-            case "Verts/ALE":
-                s = "VALE"
-            case "PPE-DE":
-                s = "PPE"
-            case 'GUE/NGL':
-                s = "GUE"
-            case 'S&D':
-                s = "SD"
-        return cls[s]
-
-
-class Committee(Enum):
-    AFET = "Committee on Foreign Affairs"
-    DEFE = "Subcommittee on Security and Defence"
-    DROI = "Subcommittee on Human Rights"
-    DEVE = "Committee on Development"
-    INTA = "Committee on International Trade"
-    BUDG = "Committee on Budgets"
-    CONT = "Committee on Budgetary Control"
-    ECON = "Committee on Economic and Monetary Affairs"
-    FISC = "Subcommittee on Tax Matters"
-    EMPL = "Committee on Employment and Social Affairs"
-    ENVI = "Committee on Environment, Public Health and Food Safety"
-    ITRE = "Committee on Industry, Research and Energy"
-    IMCO = "Committee on Internal Market and Consumer Protection"
-    TRAN = "Committee on Transport and Tourism"
-    REGI = "Committee on Regional Development"
-    AGRI = "Committee on Agriculture and Rural Development"
-    PECH = "Committee on Fisheries"
-    CULT = "Committee on Culture and Education"
-    JURI = "Committee on Legal Affairs"
-    LIBE = "Committee on Civil Liberties, Justice and Home Affairs"
-    AFCO = "Committee on Constitutional Affairs"
-    FEMM = "Committee on Women's Rights and Gender Equality"
-    PETI = "Committee on Petitions"
-
-
 class Member(Base):
     __tablename__ = "members"
 
     id: Mapped[int] = mapped_column(primary_key=True)
     full_name: Mapped[str]
-    group: Mapped[Group]
-    party: Mapped[str]
+    last_name: Mapped[str]
+    constituencies: Mapped[str]
+    groups: Mapped[str]
+    row: Mapped[int]
 
 
 class Procedure(Base):
     __tablename__ = "procedures"
 
-    class Type(Enum):
-        RSP = "Resolutions on topical subjects"
-        INS = "Institutional procedure"
-        NLE = "Non-legislative enactments"
-        COD = "Ordinary legislative procedure (ex-codecision procedure)"
-        JOIN = "Joint document from the Commission and the High Representative"
-        INI = "Own-initiative procedure"
-        BUI = "Budgetary initiative"
-        CNS = "Consultation procedure"
-        RPS = "Implementing acts"
-        INL = "Legislative initiative procedure"
-        APP = "Consent procedure"
-        ACI = "Interinstitutional agreement procedure"
-        SWD = "Commission working document"
-        BUD = "Budgetary procedure"
-        DEA = "Delegated acts procedure"
-        C = "Other Commission document"
-        COM = "Commission document"
-        DEC = "Discharge procedure"
-        RSO = "Internal organisation decisions"
-        REG = "Parliament's Rules of Procedure"
-        IMM = "Members' immunity"
-
-        @classmethod
-        def from_str(cls, s):
-            return cls[s.split(" ")[0]]
-
     reference: Mapped[str] = mapped_column(primary_key=True)
+    date: Mapped[Optional[datetime.datetime]] = mapped_column(index=True)
     title: Mapped[str]
-    type: Mapped[Type]
-    subject: Mapped[str]
-    date: Mapped[date]
+    type: Mapped[str]
+    subjects: Mapped[str]
+    countries: Mapped[str]
+    committees: Mapped[str]
+    docs: Mapped[str]
+    status: Mapped[str]
     url: Mapped[str]
+    row: Mapped[int]
+
+
+class Doc(Base):
+    __tablename__ = "docs"
+
+    ref: Mapped[str] = mapped_column(primary_key=True)
+    procedure: Mapped[Optional[str]] = mapped_column(
+        ForeignKey(Procedure.reference), index=True
+    )
+    url: Mapped[Optional[str]]
+    row: Mapped[int]
+
 
 class Amendment(Base):
     __tablename__ = "amendments"
 
-    id: Mapped[str] = mapped_column(primary_key=True)
-    procedure_ref = mapped_column(ForeignKey(Procedure.reference))
+    row: Mapped[int] = mapped_column(primary_key=True)
+    doc: Mapped[str] = mapped_column(ForeignKey(Doc.ref), index=True)
+    nr: Mapped[int]
     old: Mapped[Optional[str]]
     new: Mapped[Optional[str]]
+    diff: Mapped[str]
+    authors: Mapped[str]
+    url: Mapped[str]
 
 
 class Vote(Base):
     __tablename__ = "votes"
 
-    id: Mapped[int] = mapped_column(primary_key=True)
-    procedure_ref = mapped_column(ForeignKey(Procedure.reference))
-    amendment_id = mapped_column(ForeignKey(Amendment.id))
-    title: Mapped[str]
-    positions: Mapped[list[dict]] = mapped_column(JSON)
-    date: Mapped[date]
+    row: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[Optional[str]] = mapped_column(index=True)
+    date: Mapped[datetime.date] = mapped_column(index=True)
+    doc: Mapped[str] = mapped_column(ForeignKey(Doc.ref), index=True)
+    ref: Mapped[Optional[str]] = mapped_column(
+        ForeignKey(Procedure.reference), index=True
+    )
+    subject: Mapped[Optional[str]]
+    subject_rcv: Mapped[Optional[str]]
+    author: Mapped[Optional[str]]
+    type: Mapped[str]
+    amendment: Mapped[Optional[str]]
+    split: Mapped[Optional[str]]
+    rcv: Mapped[Optional[bool]]
+    result: Mapped[Optional[str]]
+    votes: Mapped[Optional[str]]
+    positions: Mapped[Optional[str]]
+    group_votes: Mapped[Optional[str]]
+    url: Mapped[Optional[str]]
+    url_rcv: Mapped[Optional[str]]
 
 
 class Position(Base):
@@ -149,6 +107,10 @@ class Position(Base):
                 case "0":
                     return cls.ABSTENTION
 
-    vote_id: Mapped[int] = mapped_column(ForeignKey(Vote.id), primary_key=True)
-    member_id: Mapped[int] = mapped_column(ForeignKey(Member.id), primary_key=True)
+    vote_row: Mapped[int] = mapped_column(
+        ForeignKey(Vote.row, ondelete="CASCADE"), primary_key=True
+    )
+    member_id: Mapped[int] = mapped_column(
+        ForeignKey(Member.id), primary_key=True, index=True
+    )
     position: Mapped[Position]